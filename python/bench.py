@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# Copyright 2023 David Kalliecharan <dave@dal.ca>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS “AS IS”
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE
+
+"""Benchmark the mesh -> assemble -> solve -> project -> write pipeline
+
+Each (geo file, MeshSizeFactor) case runs in a fresh process so the peak
+RSS reported per stage belongs to that case only.
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import platform
+import resource
+from pathlib import Path
+from rich import print
+from sys import exit
+from tempfile import TemporaryDirectory
+from time import perf_counter, strftime
+
+
+ROOT = Path(".").absolute().parent
+MESH_DIR = ROOT / "gmsh"
+
+BENCH_GEO_FILES = [
+    "calibration_rod.geo",
+    "system.calibration.geo",
+    "system.geo",
+]
+
+STAGES = ["mesh", "load", "assemble", "solve", "project", "write"]
+
+
+def peak_rss() -> int:
+    """Peak resident set size of this process in kB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_case(geofile: str, size: float, pressure: float=-31.03E6) -> list:
+    """Runs the pipeline once, returns a record per stage"""
+    # Imported here so each worker process pays (and reports) its own startup
+    import numpy as np
+
+    # MFEM v4.5 uses deprecated numpy variable numpy.long
+    major, minor, micro = [int(v) for v in np.__version__.split('.')]
+    if major == 1 and micro > 23:
+        np.long = np.longlong
+
+    from elasticity import StrainCoefficient
+    from fea import (
+        essential_dofs,
+        lame_coefficients,
+        pwj_load,
+        save_paraview_frame,
+        solve_system,
+    )
+    from mesh import generate_mesh
+    import mfem.ser as mfem
+
+    records = []
+    def record(stage, t0, **kws):
+        records.append({
+            "geo": Path(geofile).name,
+            "size": size,
+            "stage": stage,
+            "wall": perf_counter() - t0,
+            "peak_rss": peak_rss(),
+            **kws,
+        })
+
+    with TemporaryDirectory() as tmp:
+        meshfile = str(Path(tmp) / "bench.msh")
+
+        t0 = perf_counter()
+        generate_mesh(geofile, meshfile, size)
+        record("mesh", t0)
+
+        t0 = perf_counter()
+        mesh = mfem.Mesh(meshfile, 1, 1)
+        dim = mesh.Dimension()
+        record("load", t0, elements=mesh.GetNE())
+
+        t0 = perf_counter()
+        fec = mfem.H1_FECollection(1, dim)
+        fespace = mfem.FiniteElementSpace(mesh, fec, dim)
+        ess_tdof_list = essential_dofs(mesh, fespace)
+        b = pwj_load(mesh, fespace, pressure)
+        x = mfem.GridFunction(fespace)
+        x.Assign(0.0)
+        lamb_coef, mu_coef = lame_coefficients(mesh, "Al 6061-T6", "Ti6Al4V-G23",
+                                               verbose=False)
+        a = mfem.BilinearForm(fespace)
+        a.AddDomainIntegrator(mfem.ElasticityIntegrator(lamb_coef, mu_coef))
+        a.Assemble()
+        A = mfem.OperatorPtr()
+        B = mfem.Vector()
+        X = mfem.Vector()
+        a.FormLinearSystem(ess_tdof_list, x, b, A, X, B)
+        dofs = fespace.GetTrueVSize()
+        record("assemble", t0, dofs=dofs)
+
+        t0 = perf_counter()
+        AA = mfem.OperatorHandle2SparseMatrix(A)
+        iterations, final_norm = solve_system(AA, B, X, print_level=0)
+        a.RecoverFEMSolution(X, b, x)
+        record("solve", t0, dofs=dofs, iterations=iterations,
+               final_norm=final_norm)
+
+        t0 = perf_counter()
+        if not mesh.NURBSext:
+            mesh.SetNodalFESpace(fespace)
+        scalar_space = mfem.FiniteElementSpace(mesh, fec)
+        strain = mfem.GridFunction(scalar_space)
+        strain_coef = StrainCoefficient()
+        strain_coef.SetDisplacement(x)
+        strain_coef.SetComponent(2, 2)
+        strain.ProjectCoefficient(strain_coef)
+        record("project", t0)
+
+        t0 = perf_counter()
+        save_paraview_frame("bench", 0.0, mesh, x, strain, prefix=tmp)
+        record("write", t0)
+
+    return records
+
+
+def compare(results: list, baseline: list, threshold: float,
+            rss_threshold: float) -> list:
+    """Returns the regressions of results relative to the baseline"""
+    reference = {(r["geo"], r["size"], r["stage"]): r for r in baseline}
+    regressions = []
+    for r in results:
+        key = (r["geo"], r["size"], r["stage"])
+        if key not in reference:
+            continue
+        ref = reference[key]
+        checks = [("wall", threshold), ("peak_rss", rss_threshold)]
+        if "iterations" in r and "iterations" in ref:
+            checks.append(("iterations", threshold))
+        for metric, limit in checks:
+            if ref[metric] <= 0:
+                continue
+            ratio = r[metric] / ref[metric]
+            if ratio > 1 + limit:
+                regressions.append({
+                    "geo": r["geo"],
+                    "size": r["size"],
+                    "stage": r["stage"],
+                    "metric": metric,
+                    "baseline": ref[metric],
+                    "value": r[metric],
+                    "ratio": ratio,
+                })
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("geofiles", type=str, nargs="*",
+                        default=[str(MESH_DIR / g) for g in BENCH_GEO_FILES],
+                        help="Input geo files (dflt: calibration and system geo files)")
+    parser.add_argument("-s", "--sizes", type=float, nargs="+",
+                        default=[0.4, 0.2, 0.1],
+                        help="Mesh Size Factors to benchmark")
+    parser.add_argument("-r", "--repeat", type=int, default=1,
+                        help="Repeats per case, the fastest is kept")
+    parser.add_argument("-o", "--output", type=str, default="../data/bench.json",
+                        help="Benchmark results (json)")
+    parser.add_argument("-b", "--baseline", type=str, default=None,
+                        help="Baseline results (json) to compare against")
+    parser.add_argument("--save-baseline", action="store_true", default=False,
+                        help="Also write the results as the baseline")
+    parser.add_argument("-t", "--threshold", type=float, default=0.2,
+                        help="Allowed relative slowdown in wall time and iterations")
+    parser.add_argument("--rss-threshold", type=float, default=0.1,
+                        help="Allowed relative growth in peak RSS")
+
+    args = parser.parse_args()
+
+    cases = [(g, s) for g in args.geofiles for s in args.sizes]
+
+    results = []
+    # One case per fresh (spawned) process for independent timings and RSS
+    ctx = multiprocessing.get_context("spawn")
+    for geofile, size in cases:
+        print(f"Benchmarking {Path(geofile).name} @ MeshSizeFactor {size}")
+        best = None
+        for _ in range(args.repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                records = pool.submit(run_case, geofile, size).result()
+            if best is None:
+                best = records
+            else:
+                best = [min(r0, r1, key=lambda r: r["wall"])
+                        for r0, r1 in zip(best, records)]
+        for r in best:
+            print(f"  {r['stage']:>8s} : {r['wall']:8.3f} s | {r['peak_rss'] / 1024:8.1f} MB"
+                  + (f" | dofs {r['dofs']}" if "dofs" in r else "")
+                  + (f" | iterations {r['iterations']}" if "iterations" in r else ""))
+        results.extend(best)
+
+    report = {
+        "date": strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.save_baseline:
+        baseline = args.baseline if args.baseline else "../data/bench_baseline.json"
+        with open(baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote baseline {baseline}")
+    elif args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"],
+                              args.threshold, args.rss_threshold)
+        for r in regressions:
+            print(f"[red]REGRESSION[/red] {r['geo']} @ {r['size']} {r['stage']} "
+                  + f"{r['metric']}: {r['baseline']:0.4g} -> {r['value']:0.4g} "
+                  + f"({r['ratio']:0.2f}x)")
+        if regressions:
+            exit(1)
+        print("No regressions")
+
+    print("Finished.")
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# Copyright 2023 David Kalliecharan <dave@dal.ca>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS “AS IS”
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE
+
+"""Mesh convergence study over a ladder of MeshSizeFactor values
+
+The gauge strains and the energy norm are extrapolated to a zero mesh size
+(Richardson) from the three finest meshes, assuming f(h) = f_0 + C h^p with
+h proportional to the MeshSizeFactor. The recommended size is the coarsest
+one whose quantities are all within the tolerance of the extrapolated values.
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from rich import print
+from tempfile import TemporaryDirectory
+
+
+ROOT = Path(".").absolute().parent
+
+# Roache's factor of safety for the grid convergence index of 3 meshes
+GCI_SAFETY = 1.25
+
+
+def run_size(geofile: str,
+             size: float,
+             pressure: float,
+             x: float,
+             radius: float,
+             sample_material: str,
+             calibration: bool) -> dict:
+    """Meshes and solves one rung of the ladder, runs in a worker process
+
+    The mesh and the Paraview output are written to a temporary directory.
+    """
+    # MFEM v4.5 uses deprecated numpy variable numpy.long
+    major, minor, micro = [int(v) for v in np.__version__.split('.')]
+    if major == 1 and micro > 23:
+        np.long = np.longlong
+
+    from experiment import run_step
+    from fea import run_analysis
+    from mesh import generate_mesh
+
+    with TemporaryDirectory() as tmp:
+        output = str(Path(tmp) / "convergence")
+        if calibration:
+            generate_mesh(geofile, f"{output}.msh", size, quiet=True)
+            results = run_analysis(f"{output}.msh", pressure, x,
+                                   material_1=sample_material,
+                                   dataname="convergence", prefix=tmp, quiet=True)
+        else:
+            results = run_step(geofile, x, radius, size, pressure,
+                               sample_material=sample_material,
+                               output=output, dataname="convergence", prefix=tmp,
+                               quiet=True)
+
+    record = {
+        "size": size,
+        "elements": results["elements"],
+        "dofs": results["dofs"],
+        "iterations": results["iterations"],
+        "energy_norm": results["energy_norm"],
+    }
+    for k, v in results["strain"].items():
+        record[f"strain_{k}"] = v
+    if results["strain"]:
+        record["strain_mean"] = float(np.mean(list(results["strain"].values())))
+
+    return record
+
+
+def observed_order(h: np.ndarray, f: np.ndarray,
+                   p_min: float=0.05, p_max: float=10.0) -> float:
+    """Order p of f(h) = f_0 + C h^p through three points, h ascending
+
+    Solves (f_3 - f_2) / (f_2 - f_1) = (h_3^p - h_2^p) / (h_2^p - h_1^p)
+    by bisection, which allows for a non-constant refinement ratio.
+    Returns nan for oscillatory or stagnant convergence.
+    """
+    h1, h2, h3 = h
+    f1, f2, f3 = f
+    if f2 == f1 or f3 == f2:
+        return np.nan
+    ratio = (f3 - f2) / (f2 - f1)
+    if ratio <= 0:
+        return np.nan
+
+    g = lambda p: (h3**p - h2**p) / (h2**p - h1**p) - ratio
+    lo, hi = p_min, p_max
+    if g(lo) * g(hi) > 0:
+        return np.nan
+    for _ in range(200):
+        mid = 0.5 * (lo + hi)
+        if g(lo) * g(mid) <= 0:
+            hi = mid
+        else:
+            lo = mid
+
+    return 0.5 * (lo + hi)
+
+
+def richardson(h: np.ndarray, f: np.ndarray) -> dict:
+    """Extrapolated value, observed order and fine grid GCI of the finest 3"""
+    order = np.argsort(h)
+    h, f = np.asarray(h)[order][:3], np.asarray(f)[order][:3]
+    p = observed_order(h, f)
+    if np.isnan(p):
+        return {"order": np.nan, "extrapolated": np.nan, "gci": np.nan}
+
+    r = h[1] / h[0]
+    f0 = f[0] - (f[1] - f[0]) / (r**p - 1)
+    gci = GCI_SAFETY * abs((f[1] - f[0]) / f[0]) / (r**p - 1)
+
+    return {"order": p, "extrapolated": f0, "gci": gci}
+
+
+def recommend(df: pd.DataFrame, summary: dict, tol: float) -> float:
+    """Coarsest size with every quantity within tol of its extrapolation"""
+    ok = np.ones(len(df), dtype=bool)
+    for k, s in summary.items():
+        if np.isnan(s["extrapolated"]):
+            # Fall back to the finest solution as the reference
+            reference = df.sort_values("size")[k].iloc[0]
+        else:
+            reference = s["extrapolated"]
+        ok &= (np.abs(df[k] - reference) <= tol * abs(reference)).values
+
+    candidates = df["size"][ok]
+
+    return float(candidates.max()) if len(candidates) > 0 else np.nan
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("geofile", type=str, nargs="?",
+                        default=str(ROOT / "gmsh/system.calibration.geo"),
+                        help="Input geo file (dflt: calibration)")
+    parser.add_argument("-s", "--sizes", type=float, nargs="+",
+                        default=[0.8, 0.4, 0.2, 0.1, 0.05],
+                        help="MeshSizeFactor ladder")
+    parser.add_argument("-m", "--sample-material", type=str, default="Ti6Al4V-G23",
+                        help="Sample material defined in {YOUNG,SHEAR}_MOD")
+    parser.add_argument("-p", "--pressure", type=float, default=-30.0E6,
+                        help="Applied pressure in Pa")
+    parser.add_argument("-x", "--x-position", type=float, default=None,
+                        help="PWJ x position, updates the geo file (dflt: calibration case)")
+    parser.add_argument("-R", "--radius", type=float, default=2.5,
+                        help="Radius of PWJ")
+    parser.add_argument("--tol", type=float, default=0.01,
+                        help="Relative tolerance to the extrapolated values")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Parallel meshes/solves (dflt: cpu count)")
+    parser.add_argument("-o", "--output", type=str, default="../data/convergence.feather",
+                        help="Convergence table (feather)")
+
+    args = parser.parse_args()
+
+    if len(args.sizes) < 3:
+        parser.error("Richardson extrapolation needs at least 3 sizes")
+
+    calibration = args.x_position is None
+    x = 0.0 if calibration else args.x_position
+
+    # Spawned workers, gmsh is not fork safe
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=args.jobs, mp_context=ctx) as pool:
+        futures = [
+            pool.submit(run_size, args.geofile, s, args.pressure, x,
+                        args.radius, args.sample_material, calibration)
+            for s in args.sizes
+        ]
+        records = [f.result() for f in futures]
+
+    df = pd.DataFrame.from_records(records).sort_values("size", ascending=False)
+    print(df.to_string(index=False))
+
+    quantities = ["energy_norm"] + [c for c in df.columns if c.startswith("strain_")]
+    summary = {k: richardson(df["size"].values, df[k].values) for k in quantities}
+    for k, s in summary.items():
+        print(f"{k:>12s} | p : {s['order']:0.3g} | extrapolated : {s['extrapolated']:0.6g}"
+              + f" | GCI : {100 * s['gci']:0.3g} %")
+
+    size = recommend(df, summary, args.tol)
+    print(f"Recommended MeshSizeFactor within {100 * args.tol:g} %: {size:g}")
+
+    df.reset_index(drop=True).to_feather(args.output)
+
+    print("Finished.")
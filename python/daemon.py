@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# Copyright 2023 David Kalliecharan <dave@dal.ca>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS “AS IS”
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE
+
+"""Warm simulation daemon
+
+Keeps gmsh/MFEM imported, and generated meshes and assembled operators
+cached between jobs. Jobs are JSON objects sent as one line over a Unix
+socket, progress and results are streamed back as JSON lines until a "done"
+or "error" event. The jobs run on the main thread, gmsh only initializes
+there.
+
+    python daemon.py serve
+    python daemon.py submit solve --geofile ../gmsh/system.calibration.geo
+    python daemon.py submit sweep --geofile ../gmsh/system.geo --priority 0
+"""
+
+from argparse import ArgumentParser
+from hashlib import sha256
+from itertools import count
+import json
+import math
+from pathlib import Path
+import queue
+import shutil
+import socket
+import socketserver
+import threading
+import traceback
+from rich import print
+from sys import exit
+
+
+ROOT = Path(".").absolute().parent
+SOCKET = ROOT / "cache/pwjfea.sock"
+CACHE_DIR = ROOT / "cache/meshes"
+
+JOB_TYPES = ["solve", "sweep", "ping", "shutdown"]
+DEFAULT_PRIORITY = 10
+
+
+class MeshCache:
+    """Generated meshes keyed by the geo file content and MeshSizeFactor"""
+    def __init__(self, cache_dir: Path=CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, geofile: str, size: float) -> str:
+        with open(geofile, "rb") as f:
+            digest = sha256(f.read())
+        digest.update(repr(float(size)).encode())
+
+        return digest.hexdigest()
+
+    def __call__(self, geofile: str, meshfile: str, size: float,
+                 quiet: bool=False) -> None:
+        # Same signature as mesh.generate_mesh
+        from mesh import generate_mesh
+
+        cached = self.cache_dir / f"{self.key(geofile, size)}.msh"
+        if cached.exists():
+            self.hits += 1
+        else:
+            self.misses += 1
+            tmp = cached.with_suffix(".msh.tmp")
+            generate_mesh(geofile, str(tmp), size, quiet=quiet)
+            tmp.replace(cached)
+        shutil.copyfile(cached, meshfile)
+
+
+class Job:
+    def __init__(self, request: dict, stream):
+        self.request = request
+        self.stream = stream
+        self.finished = threading.Event()
+
+    def send(self, event: str, **kws):
+        try:
+            self.stream.write((json.dumps({"event": event, **kws}) + "\n").encode())
+            self.stream.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away, keep running to populate the caches
+            pass
+
+
+class Worker:
+    """Runs the queued jobs one at a time, gmsh and MFEM are not thread safe
+
+    run() has to be called from the main thread, gmsh installs signal
+    handlers when it initializes. A None job stops it.
+    """
+    def __init__(self, jobs: queue.PriorityQueue, workdir: Path):
+        from opcache import OperatorCache
+
+        self.jobs = jobs
+        self.workdir = Path(workdir)
+        self.workdir.mkdir(parents=True, exist_ok=True)
+        self.mesh_cache = MeshCache()
+        self.operator_cache = OperatorCache()
+
+    def run(self):
+        while True:
+            _, _, job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                return
+            try:
+                job.send("started")
+                results = self.dispatch(job)
+                job.send("done", results=results, cache={
+                    "hits": self.mesh_cache.hits,
+                    "misses": self.mesh_cache.misses,
+                    "operator_hits": self.operator_cache.hits,
+                    "operator_misses": self.operator_cache.misses,
+                })
+            except Exception as e:
+                job.send("error", message=str(e), traceback=traceback.format_exc())
+            finally:
+                job.finished.set()
+                self.jobs.task_done()
+
+    def dispatch(self, job: Job):
+        request = job.request
+        kind = request["type"]
+        if kind == "ping":
+            return "pong"
+        if kind == "solve":
+            return self.solve(request, job)
+        if kind == "sweep":
+            return self.sweep(request, job)
+
+        raise ValueError(f"Unknown job type '{kind}', use one of {JOB_TYPES}")
+
+    def solve(self, request: dict, job: Job) -> dict:
+        from fea import run_analysis
+        from telemetry import Telemetry
+
+        output = str(self.workdir / "solve")
+        telemetry = Telemetry()
+        size = request.get("size", 0.1)
+        if "mesh" in request:
+            meshfile = request["mesh"]
+        else:
+            meshfile = f"{output}.msh"
+            with telemetry.phase("meshing"):
+                self.mesh_cache(request["geofile"], meshfile, size, quiet=True)
+
+        results = run_analysis(
+            meshfile,
+            request.get("pressure", -30.0E6),
+            request.get("x", 0.0),
+            material_1=request.get("sample_material", "Ti6Al4V-G23"),
+            dataname=request.get("name", "calibration"),
+            telemetry=telemetry,
+            quiet=True,
+            operator_cache=self.operator_cache,
+        )
+
+        return telemetry.write(**results)
+
+    def sweep(self, request: dict, job: Job) -> list:
+        from experiment import run_step, sweep_positions
+        from telemetry import Telemetry
+
+        step_size = request.get("step_size", 1.0)
+        radius = request.get("radius", 2.5)
+        vtr = request.get("vtr", 21.167)
+        positions = sweep_positions(radius, step_size,
+                                    request.get("no_overlap", False))
+
+        telemetry = Telemetry(request.get("telemetry"))
+        records = []
+        for i, x in enumerate(positions):
+            elapsed_time = round(step_size * i / vtr, 4)
+            results = run_step(
+                request["geofile"],
+                x,
+                radius,
+                request.get("size", 0.1),
+                request.get("pressure", -31.03E6),
+                sample_material=request.get("sample_material", "Ti6Al4V-G23"),
+                output=str(self.workdir / "sweep"),
+                cycle=i,
+                time=elapsed_time,
+                dataname=request.get("name", "experiment"),
+                telemetry=telemetry,
+                quiet=True,
+                mesher=self.mesh_cache,
+                operator_cache=self.operator_cache,
+            )
+            record = telemetry.write(cycle=i, x=float(x), time=elapsed_time,
+                                     **results)
+            records.append(record)
+            job.send("step", step=i, steps=len(positions), record=record)
+
+        return records
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            self.wfile.write((json.dumps({"event": "error", "message": str(e)}) + "\n").encode())
+            return
+
+        server = self.server
+        if request.get("type") == "shutdown":
+            self.wfile.write((json.dumps({"event": "done", "results": "bye"}) + "\n").encode())
+            # Stops the worker after the running job, ahead of the queued ones
+            server.jobs.put((-math.inf, next(server.sequence), None))
+            return
+
+        job = Job(request, self.wfile)
+        priority = request.get("priority", DEFAULT_PRIORITY)
+        # Announce before queuing, the worker may start it straight away
+        job.send("queued", position=server.jobs.qsize() + 1)
+        # Lower priority values run first, FIFO within the same priority
+        server.jobs.put((priority, next(server.sequence), job))
+        job.finished.wait()
+
+
+class SimulationServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, workdir: Path):
+        super().__init__(path, RequestHandler)
+        self.jobs = queue.PriorityQueue()
+        self.sequence = count()
+        self.worker = Worker(self.jobs, workdir)
+
+
+def warm_up():
+    """Pay the import costs once, before the first job"""
+    import numpy as np
+
+    # MFEM v4.5 uses deprecated numpy variable numpy.long
+    major, minor, micro = [int(v) for v in np.__version__.split('.')]
+    if major == 1 and micro > 23:
+        np.long = np.longlong
+
+    import gmsh
+    import mfem.ser
+    import experiment
+    import fea
+
+
+def serve(path: str=str(SOCKET), workdir: Path=ROOT / "cache/work"):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        path.unlink()
+
+    warm_up()
+    with SimulationServer(str(path), workdir) as server:
+        # The connections are served in the background, the jobs run here
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Listening on {path}")
+        try:
+            server.worker.run()
+        finally:
+            server.shutdown()
+            path.unlink(missing_ok=True)
+
+
+def submit(request: dict, path: str=str(SOCKET)):
+    """Sends a job to the daemon, yields the streamed events"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(str(path))
+        s.sendall((json.dumps(request) + "\n").encode())
+        with s.makefile("r") as f:
+            for line in f:
+                event = json.loads(line)
+                yield event
+                if event["event"] in ("done", "error"):
+                    return
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("-S", "--socket", type=str, default=str(SOCKET),
+                        help="Unix socket path")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("serve", help="Run the daemon")
+
+    sub = commands.add_parser("submit", help="Submit a job to the daemon")
+    sub.add_argument("type", type=str, choices=JOB_TYPES, help="Job type")
+    sub.add_argument("-g", "--geofile", type=str, help="Input geo file")
+    sub.add_argument("--mesh", type=str, help="Input mesh file (solve only)")
+    sub.add_argument("-m", "--sample-material", type=str, default="Ti6Al4V-G23",
+                     help="Sample material defined in {YOUNG,SHEAR}_MOD")
+    sub.add_argument("-p", "--pressure", type=float, default=None,
+                     help="Applied pressure in Pa")
+    sub.add_argument("-x", "--x-position", type=float, default=0.0,
+                     help="x position of the PWJ (solve only)")
+    sub.add_argument("-s", "--size", type=float, default=0.1,
+                     help="Mesh Size Factor (dflt: 0.1)")
+    sub.add_argument("-R", "--radius", type=float, default=2.5,
+                     help="Radius of PWJ")
+    sub.add_argument("--step-size", type=float, default=1,
+                     help="Step size [mm] for PWJ to traverse")
+    sub.add_argument("-v", "--vtr", type=float, default=21.167,
+                     help="VTR in mm/s")
+    sub.add_argument("--no-overlap", action="store_true", default=False,
+                     help="Only allow PWJ to be fully on sample")
+    sub.add_argument("-n", "--name", type=str, default=None,
+                     help="Paraview output name")
+    sub.add_argument("-t", "--telemetry", type=str, default=None,
+                     help="Write per step timings to a JSON lines file (sweep only)")
+    sub.add_argument("-P", "--priority", type=int, default=DEFAULT_PRIORITY,
+                     help="Job priority, lower runs first")
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.socket)
+        exit()
+
+    # The daemon runs from its own directory, send absolute paths
+    resolve = lambda p: None if p is None else str(Path(p).absolute())
+
+    request = {"type": args.type, "priority": args.priority}
+    if args.type == "solve":
+        request.update(size=args.size, x=args.x_position,
+                       sample_material=args.sample_material)
+        request.update({"geofile": resolve(args.geofile)} if args.mesh is None
+                       else {"mesh": resolve(args.mesh)})
+    elif args.type == "sweep":
+        request.update(geofile=resolve(args.geofile), size=args.size,
+                       radius=args.radius, step_size=args.step_size,
+                       vtr=args.vtr, no_overlap=args.no_overlap,
+                       sample_material=args.sample_material,
+                       telemetry=resolve(args.telemetry))
+    if args.pressure is not None:
+        request["pressure"] = args.pressure
+    if args.name is not None:
+        request["name"] = args.name
+
+    for event in submit(request, args.socket):
+        if event["event"] == "step":
+            record = event["record"]
+            print(f"Step {event['step'] + 1}/{event['steps']} | "
+                  + f"x {record['x']:+05.1f} mm | {record['total']:0.2f} s")
+        elif event["event"] == "error":
+            print(f"[red]Error:[/red] {event['message']}")
+            print(event.get("traceback", ""))
+            exit(1)
+        elif event["event"] == "done":
+            print(event["results"])
+        else:
+            print(event)
@@ -36,14 +36,24 @@ from elasticity import (
 )
 
 from argparse import ArgumentParser
-from fea import run_analysis
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from fea import REORDER_HELP, REORDERINGS, run_analysis
+from itertools import islice
+import multiprocessing
 from mesh import (
     guess_mesh_file,
     update_pwj_parameters,
     generate_mesh,
 )
 from numpy import arange
+from opcache import OperatorCache
+from pathlib import Path
+from shutil import rmtree
 from sys import exit
+from telemetry import Telemetry
+from time import perf_counter
+from typing import Callable, Generator, Union
 
 X_HAT = 2
 Y_HAT = 2
@@ -51,6 +61,217 @@ Z_HAT = 2
 
 SAMPLE_BOUNDARY = 9.5 # mm
 
+
+def sweep_positions(radius: float,
+                    step_size: float,
+                    no_overlap: bool=False) -> np.ndarray:
+    """PWJ x positions (mm) traversing the sample"""
+    limit = SAMPLE_BOUNDARY + radius
+    if no_overlap == True:
+        sweep = arange(-SAMPLE_BOUNDARY + radius,
+                       SAMPLE_BOUNDARY - radius + step_size,
+                       step_size)
+    else:
+        sweep = arange(-limit + step_size, limit, step_size)
+
+    # Ensure precision is within 1 decimal point
+    return np.round(sweep, 1)
+
+
+def symmetric_plan(sweep: np.ndarray) -> list:
+    """Pairs each x >= 0 step with its mirror image at -x
+
+    Returns (cycle, x, mirror cycle) to solve, the mirror cycle is None when
+    -x is not part of the sweep and the negative x steps without a positive
+    counterpart are solved directly.
+    """
+    cycles = {float(x): i for i, x in enumerate(sweep)}
+    plan = []
+    paired = set()
+    for i, x in enumerate(sweep):
+        if x < 0:
+            continue
+        j = cycles.get(float(-x)) if x > 0 else None
+        if j is not None:
+            paired.add(j)
+        plan.append((i, x, j))
+
+    for i, x in enumerate(sweep):
+        if x < 0 and i not in paired:
+            plan.append((i, x, None))
+
+    return sorted(plan, key=lambda p: p[0])
+
+
+def remove_step_files(meshfile: str) -> None:
+    """Removes a step's mesh (file or *.npmesh directory) and geo file"""
+    for path in (Path(meshfile), Path(meshfile).with_suffix(".geo")):
+        if path.is_dir():
+            rmtree(path)
+        elif path.exists():
+            path.unlink()
+
+
+def mesh_step(geofile: str,
+              x: float,
+              radius: float,
+              size: float,
+              output: str,
+              quiet: bool=False,
+              mesher: Callable=generate_mesh,
+              mesh_suffix: str=".msh") -> tuple[str, str, dict]:
+    """Updates the geo file and meshes it, returns (mesh, geo, phase timings)"""
+    t0 = perf_counter()
+    geofile_guess = guess_mesh_file(geofile, x, 0.0, radius)
+    update_pwj_parameters(
+        geofile_guess,
+        x,
+        0.0,
+        radius,
+        outfile=f"{output}.geo",
+        quiet=quiet,
+    )
+
+    t1 = perf_counter()
+    mesher(f"{output}.geo", f"{output}{mesh_suffix}", size, quiet=quiet)
+    phases = {"geo_update": t1 - t0, "meshing": perf_counter() - t1}
+
+    return f"{output}{mesh_suffix}", str(geofile_guess), phases
+
+
+def run_step(geofile: str,
+             x: float,
+             radius: float,
+             size: float,
+             pressure: float,
+             sample_material: str="Ti6Al4V-G23",
+             output: str="output",
+             cycle: int=0,
+             time: float=0.0,
+             dataname: str="experiment",
+             telemetry: Union[Telemetry, None]=None,
+             quiet: bool=False,
+             mesher: Callable=generate_mesh,
+             mirror: Union[tuple[int, float], None]=None,
+             mesh_suffix: str=".msh",
+             archive: Union[str, None]=None,
+             reorder: Union[str, None]=None,
+             mixed: bool=False,
+             multigrid: Union[tuple[int, int], None]=None,
+             operator_cache: Union[OperatorCache, None]=None,
+             prefix: str="../paraview") -> dict:
+    """Updates the geo file, meshes and solves for the PWJ at x
+
+    mirror is the (cycle, time) of the rotated step at -x, see run_analysis.
+    mesh_suffix ".npmesh" hands the mesh over in the binary format.
+    operator_cache and prefix are passed to run_analysis.
+    """
+    if telemetry is None:
+        telemetry = Telemetry()
+
+    meshfile, geofile_guess, phases = mesh_step(geofile, x, radius, size, output,
+                                                quiet, mesher, mesh_suffix)
+    for k, v in phases.items():
+        telemetry.add(k, v)
+
+    results = run_analysis(
+        meshfile,
+        pressure,
+        x,
+        material_1=sample_material,
+        cycle=cycle,
+        time=time,
+        dataname=dataname,
+        telemetry=telemetry,
+        quiet=quiet,
+        mirror=mirror,
+        archive=archive,
+        reorder=reorder,
+        mixed=mixed,
+        multigrid=multigrid,
+        operator_cache=operator_cache,
+        prefix=prefix,
+    )
+    results["geofile"] = geofile_guess
+
+    return results
+
+
+def sweep(geofile: str,
+          plan: list,
+          radius: float,
+          size: float,
+          pressure: float,
+          step_size: float=1,
+          vtr: float=21.167,
+          output: str="output",
+          telemetry: Union[Telemetry, None]=None,
+          mesher: Callable=generate_mesh,
+          mesh_suffix: str=".msh",
+          lookahead: int=2,
+          **kws) -> Generator[dict, None, None]:
+    """Solves the (cycle, x, mirror cycle) plan, yielding each step's results
+
+    The next lookahead steps are meshed ahead in a helper process while the
+    current step is solved and written. Only meshing is pipelined, PyMFEM
+    holds the GIL so a writer thread would just take turns with the next
+    solve. The yielded results also hold "cycle", "x", "time" and
+    "mirror_cycle". Step meshes are named <output>_<cycle> and removed once
+    loaded. kws go to run_analysis.
+    """
+    if telemetry is None:
+        telemetry = Telemetry()
+    quiet = kws.get("quiet", False)
+
+    # Spawned helper, gmsh is not fork safe
+    ctx = multiprocessing.get_context("spawn")
+    meshing = ProcessPoolExecutor(max_workers=1, mp_context=ctx)
+    steps = iter(plan)
+    meshes = deque()
+
+    def mesh_next():
+        for i, x, j in islice(steps, 1):
+            future = meshing.submit(mesh_step, geofile, x, radius, size,
+                                    f"{output}_{i:06d}", quiet, mesher,
+                                    mesh_suffix)
+            meshes.append((i, x, j, future))
+
+    try:
+        for _ in range(max(lookahead, 1)):
+            mesh_next()
+
+        while meshes:
+            i, x, j, future = meshes.popleft()
+            meshfile, geofile_guess, phases = future.result()
+            mesh_next()
+            for k, v in phases.items():
+                telemetry.add(k, v)
+
+            time = round(step_size * i / vtr, 4)
+            mirror = None if j is None else (j, round(step_size * j / vtr, 4))
+            results = run_analysis(
+                meshfile,
+                pressure,
+                x,
+                cycle=i,
+                time=time,
+                telemetry=telemetry,
+                mirror=mirror,
+                **kws,
+            )
+            remove_step_files(meshfile)
+            results.update(geofile=geofile_guess, cycle=i, x=float(x),
+                           time=time, mirror_cycle=j)
+
+            yield results
+    finally:
+        # Also reached when the consumer stops early
+        meshing.shutdown(cancel_futures=True)
+        for *_, future in meshes:
+            if not future.cancelled() and future.exception() is None:
+                remove_step_files(future.result()[0])
+
+
 if __name__ == "__main__":
     parser = ArgumentParser()
 
@@ -67,6 +288,12 @@ if __name__ == "__main__":
                         help="Only allow PWJ to be fully on sample")
     parser.add_argument("-n", "--name", type=str, default="experiment",
                         help="Paraview output name")
+    parser.add_argument("-t", "--telemetry", type=str, default=None,
+                        help="Write per step timings to a JSON lines file")
+    parser.add_argument("-q", "--quiet", action="store_true", default=False,
+                        help="Only report progress per step")
+    parser.add_argument("--symmetric", action="store_true", default=False,
+                        help="Solve x >= 0 only and mirror the results about x = 0")
 
     group = parser.add_argument_group("Mesh settings")
     group.add_argument("-o", "--output", help="Output file name",
@@ -77,56 +304,112 @@ if __name__ == "__main__":
                        type=float, default=0.1)
     group.add_argument("--step-size", type=float, default=1,
                        help="Step size [mm] for PWJ to traverse")
+    group.add_argument("--binary", action="store_true", default=False,
+                       help="Hand meshes from gmsh to MFEM as *.npmesh")
+    group.add_argument("--archive", type=str, default=None,
+                       help="Also save each step's mesh and fields as <ARCHIVE>_<x>.npmesh")
+    group.add_argument("--reorder", type=str, default=None, choices=REORDERINGS,
+                       help=REORDER_HELP)
+    group.add_argument("--mixed", action="store_true", default=False,
+                       help="Mixed precision solve to a float64 residual tolerance,"
+                             + " an accuracy mode, slower than the default solve")
+    group.add_argument("--multigrid", type=int, nargs=2, default=None,
+                       metavar=("REFINEMENTS", "ORDERS"),
+                       help="Multigrid solve on the mesh refined and order elevated, use a coarse --size")
+    group.add_argument("--pipeline", action="store_true", default=False,
+                       help="Mesh the next steps ahead of the solves, see sweep()")
     group.add_argument("-d", "--debug", action="store_true", default=False,
                        help="Debug range")
 
     args = parser.parse_args()
 
-    print(args)
+    if not args.quiet:
+        print(args)
 
     step_size = args.step_size
     radius = args.radius
     vtr = args.vtr
     no_overlap = args.no_overlap
     dataname = args.name
+    quiet = args.quiet
+    telemetry = Telemetry(args.telemetry)
 
-    limit = SAMPLE_BOUNDARY + radius
-    if no_overlap == True:
-        sweep = arange(-SAMPLE_BOUNDARY + radius,
-                       SAMPLE_BOUNDARY - radius + step_size,
-                       step_size)
+    positions = sweep_positions(radius, step_size, no_overlap)
+    if args.symmetric:
+        plan = symmetric_plan(positions)
     else:
-        sweep = arange(-limit + step_size, limit, step_size)
+        plan = [(i, x, None) for i, x in enumerate(positions)]
 
-    for i, x in enumerate(sweep):
-        # Ensure precision is within 1 decimal point
-        x = np.round(x, 1)
-        print(f"Calculating with PWJ at {x} mm")
-
-        elapsed_time = step_size * i / vtr
-        elapsed_time = round(elapsed_time, 4)
-        print(f"Time step at {elapsed_time} s")
-        if args.debug == True:
-            continue
-        geofile_guess = guess_mesh_file(args.geofile, x, 0.0, radius)
-        update_pwj_parameters(
-            geofile_guess,
-            x,
-            0.0,
-            radius,
-            outfile=f"{args.output}.geo",
-        )
+    def report(results: dict):
+        i, x, j = results["cycle"], results["x"], results["mirror_cycle"]
+        record = telemetry.write(cycle=i, x=x, time=results["time"],
+                                 geofile=results["geofile"],
+                                 strain=results["strain"])
+        if j is not None:
+            telemetry.write(cycle=j, x=-x, time=round(step_size * j / vtr, 4),
+                            mirrored_from=i, strain=results["strain_mirror"])
+        if quiet:
+            print(f"Cycle {i} | x {x:+05.1f} mm | {record['total']:0.2f} s"
+                  + f" | {record['iterations']} iterations"
+                  + (f" | mirrored to cycle {j}" if j is not None else ""))
 
-        generate_mesh(f"{args.output}.geo", f"{args.output}.msh", args.size)
-
-        run_analysis(
-            f"{args.output}.msh",
+    if args.pipeline and not args.debug:
+        steps = sweep(
+            args.geofile,
+            plan,
+            radius,
+            args.size,
             args.pressure,
-            x,
+            step_size=step_size,
+            vtr=vtr,
+            output=args.output,
+            telemetry=telemetry,
+            mesh_suffix=".npmesh" if args.binary else ".msh",
             material_1=args.sample_material,
-            cycle=i,
-            time=elapsed_time,
             dataname=dataname,
+            quiet=quiet,
+            archive=args.archive,
+            reorder=args.reorder,
+            mixed=args.mixed,
+            multigrid=args.multigrid,
         )
+        for results in steps:
+            report(results)
+    else:
+        for i, x, j in plan:
+            elapsed_time = step_size * i / vtr
+            elapsed_time = round(elapsed_time, 4)
+            mirror = None
+            if j is not None:
+                mirror = (j, round(step_size * j / vtr, 4))
+            if not quiet or args.debug:
+                print(f"Calculating with PWJ at {x} mm")
+                print(f"Time step at {elapsed_time} s")
+                if mirror is not None:
+                    print(f"Mirrored to {-x} mm at {mirror[1]} s")
+            if args.debug == True:
+                continue
+            results = run_step(
+                args.geofile,
+                x,
+                radius,
+                args.size,
+                args.pressure,
+                sample_material=args.sample_material,
+                output=args.output,
+                cycle=i,
+                time=elapsed_time,
+                dataname=dataname,
+                telemetry=telemetry,
+                quiet=quiet,
+                mirror=mirror,
+                mesh_suffix=".npmesh" if args.binary else ".msh",
+                archive=args.archive,
+                reorder=args.reorder,
+                mixed=args.mixed,
+                multigrid=args.multigrid,
+            )
+            results.update(cycle=i, x=float(x), time=elapsed_time, mirror_cycle=j)
+            report(results)
 
     print("Finished.")
@@ -44,7 +44,9 @@ from mesh import (
     generate_mesh,
 )
 from numpy import arange
+from opcache import CACHE_DIR, OperatorCache
 from sys import exit
+from telemetry import Telemetry
 
 X_HAT = 2
 Y_HAT = 2
@@ -70,6 +72,13 @@ if __name__ == "__main__":
                        type=float, default=0.1)
     group.add_argument("-d", "--debug", action="store_true", default=False,
                        help="Debug range")
+    parser.add_argument("-t", "--telemetry", type=str, default=None,
+                        help="Write per phase timings to a JSON lines file")
+    parser.add_argument("--operator-cache", type=str, nargs="?", default=None,
+                        const=str(CACHE_DIR), metavar="DIR",
+                        help=f"Reuse assembled operators (dflt: {CACHE_DIR})")
+    parser.add_argument("-q", "--quiet", action="store_true", default=False,
+                        help="Suppress console output")
 
     args = parser.parse_args()
 
@@ -83,7 +92,9 @@ if __name__ == "__main__":
         print(args)
         exit()
 
-    generate_mesh(geofile, f"{fname_out}.msh", mesh_size)
+    telemetry = Telemetry(args.telemetry)
+    with telemetry.phase("meshing"):
+        generate_mesh(geofile, f"{fname_out}.msh", mesh_size, quiet=args.quiet)
 
     pwj_loc = 0
     run_analysis(
@@ -92,6 +103,11 @@ if __name__ == "__main__":
         pwj_loc,
         material_1=sample_material,
         dataname="calibration",
+        telemetry=telemetry,
+        quiet=args.quiet,
+        operator_cache=None if args.operator_cache is None
+                       else OperatorCache(args.operator_cache),
     )
+    telemetry.write(geofile=geofile, size=mesh_size)
 
     print("Finished.")
@@ -38,8 +38,15 @@ from elasticity import (
 from argparse import ArgumentParser
 import mfem.ser as mfem
 from mfem.ser import ParaViewDataCollection, intArray
+from multigrid import ElasticityMultigrid, elasticity_hierarchy, solve_multigrid
+from npmesh import element_data, read_mesh, save_gridfunction, save_mesh
+from opcache import CACHE_DIR, OperatorCache
 from pathlib import Path
 from rich import print
+from scipy.sparse import coo_array, csr_array
+from scipy.sparse.csgraph import reverse_cuthill_mckee
+from telemetry import Telemetry
+from typing import Union
 from unicodedata import lookup
 
 
@@ -62,6 +69,26 @@ SHEAR_MOD['Ti6Al4V-G5']  = 43E9 # GPa
 SHEAR_MOD['Ti6Al4V-G23'] = 44E9 # GPa
 SHEAR_MOD['Al 6061-T6']  = 26E9 # GPa
 
+DENSITY = {}
+DENSITY['CP-Ti-G2']    = 4510   # kg/m^3
+DENSITY['Ti6Al4V-G5']  = 4430   # kg/m^3
+DENSITY['Ti6Al4V-G23'] = 4430   # kg/m^3
+DENSITY['Al 6061-T6']  = 2700   # kg/m^3
+
+# Strain gauge locations on the post (mm), see paraview/experiment_overlap
+GAUGES = {}
+GAUGES['bot'] = (6.35, 0.0, 41.0)
+GAUGES['mid'] = (6.35, 0.0, 42.5)
+GAUGES['top'] = (6.35, 0.0, 44.0)
+
+# Element orderings for reorder_mesh
+REORDERINGS = ["hilbert", "rcm", "gecko"]
+
+REORDER_HELP = ("Reorder the elements and dofs: hilbert for locality, rcm"
+                + " (reverse Cuthill-McKee) for bandwidth, gecko for locality"
+                + " and bandwidth, the slowest at about 10 s per 100k elements")
+
+
 def lambda_shear(E, G):
     return G * (E - 2 * G) / (3 * G - E)
 
@@ -70,6 +97,158 @@ def lambda_poisson(E, nu):
     return E * nu / ((1 + nu) * (1 - 2 * nu))
 
 
+def lame_coefficients(mesh: mfem.Mesh,
+                      material_0: str,
+                      material_1: str,
+                      verbose: bool=True):
+    """Returns piece-wise constant (lambda, mu) coefficients per attribute"""
+    lamb_0 = lambda_shear(YOUNG_MOD[material_0], SHEAR_MOD[material_0])
+    lamb_1 = lambda_shear(YOUNG_MOD[material_1], SHEAR_MOD[material_1])
+
+    mu_0 = SHEAR_MOD[material_0]
+    mu_1 = SHEAR_MOD[material_1]
+
+    if verbose:
+        print(f"{material_0}  | {lookup('GREEK SMALL LETTER LAMDA')}_0 : {lamb_0:0.3g} | {lookup('GREEK SMALL LETTER MU')}_0 : {mu_0:0.3g}")
+        print(f"{material_1}  | {lookup('GREEK SMALL LETTER LAMDA')}_1 : {lamb_1:0.3g} | {lookup('GREEK SMALL LETTER MU')}_1 : {mu_1:0.3g}")
+        print(f"Max Attributes: {mesh.attributes.Max()}")
+
+    # NOTE: Single volume meshes (calibration_rod.geo) only use material_0
+    lamb = mfem.Vector(mesh.attributes.Max())
+    lamb.Assign(1.0)
+    lamb[0] *= lamb_0
+    if lamb.Size() > 1:
+        lamb[1] *= lamb_1
+    lamb_coef = mfem.PWConstCoefficient(lamb)
+
+    mu = mfem.Vector(mesh.attributes.Max())
+    mu.Assign(1.0)
+    mu[0] *= mu_0
+    if mu.Size() > 1:
+        mu[1] *= mu_1
+    mu_coef = mfem.PWConstCoefficient(mu)
+
+    return lamb_coef, mu_coef
+
+
+def lame_parameters(mesh: mfem.Mesh,
+                    material_0: str,
+                    material_1: str) -> list:
+    """(lambda, mu) per mesh attribute, as used by lame_coefficients"""
+    lame = [(1.0, 1.0)] * mesh.attributes.Max()
+    for i, material in enumerate((material_0, material_1)[:len(lame)]):
+        lame[i] = (lambda_shear(YOUNG_MOD[material], SHEAR_MOD[material]),
+                   SHEAR_MOD[material])
+
+    return lame
+
+
+def lame_piecewise(mesh: mfem.Mesh, lame: list):
+    """PWConstCoefficient (lambda, mu) from [(lambda, mu)] per attribute
+
+    Attributes past the end of lame are 1, as in lame_coefficients.
+    """
+    lamb = mfem.Vector(mesh.attributes.Max())
+    lamb.Assign(1.0)
+    mu = mfem.Vector(mesh.attributes.Max())
+    mu.Assign(1.0)
+    for i, (lamb_i, mu_i) in enumerate(lame[:lamb.Size()]):
+        lamb[i] = lamb_i
+        mu[i] = mu_i
+
+    return mfem.PWConstCoefficient(lamb), mfem.PWConstCoefficient(mu)
+
+
+def rcm_element_ordering(mesh: mfem.Mesh) -> intArray:
+    """Element ordering by the reverse Cuthill-McKee ranks of their vertices
+
+    The elements are sorted by their lowest ranked vertex, so that the vertices
+    renumbered by ReorderElements, on first touch, follow the RCM ordering
+    of the vertex graph.
+    """
+    _, elements, _ = element_data(mesh)
+    nv = mesh.GetNV()
+    # Every pair of vertices of an element is an edge of the graph
+    i, j = np.triu_indices(elements.shape[1], 1)
+    graph = coo_array((np.ones(len(elements) * len(i), dtype=np.int8),
+                       (elements[:, i].ravel(), elements[:, j].ravel())),
+                      shape=(nv, nv)).tocsr()
+    rank = np.empty(nv, dtype=np.int64)
+    rank[reverse_cuthill_mckee(graph, symmetric_mode=False)] = np.arange(nv)
+
+    ranks = rank[elements]
+    order = np.lexsort((ranks.max(axis=1), ranks.min(axis=1)))
+    # ordering[i] is the new index of element i
+    ordering = intArray(len(order))
+    ordering.GetDataArray()[order] = np.arange(len(order))
+
+    return ordering
+
+
+def reorder_mesh(mesh: mfem.Mesh, method: str="hilbert") -> None:
+    """Renumbers the elements, and with them the vertices, for locality
+
+    Call before building the FE space, the order 1 dofs follow the vertex
+    numbering. Use with byVDIM ordering so that the components of a node
+    are adjacent as well. Only rcm reduces the bandwidth much, gecko is tuned
+    down from its defaults (4 iterations, window 4) which take 5 times longer
+    for a similar ordering.
+    """
+    if method not in REORDERINGS:
+        raise ValueError(f"Unknown reordering '{method}', use one of {REORDERINGS}")
+
+    ordering = intArray()
+    if method == "gecko":
+        mesh.GetGeckoElementOrdering(ordering, 1, 2)
+    elif method == "rcm":
+        ordering = rcm_element_ordering(mesh)
+    else:
+        mesh.GetHilbertElementOrdering(ordering)
+    mesh.ReorderElements(ordering, True)
+
+
+def bandwidth(A: mfem.SparseMatrix) -> int:
+    """Largest |i - j| over the non-zeros of A"""
+    I, J = A.GetIArray(), A.GetJArray()
+    rows = np.repeat(np.arange(A.Height()), np.diff(I))
+
+    return int(np.abs(rows - J).max()) if len(J) > 0 else 0
+
+
+def clamped_boundary(mesh: mfem.Mesh) -> intArray:
+    """Boundary attribute marker of the clamped post base"""
+    return intArray([1]+[0]*(mesh.bdr_attributes.Max()-1))
+
+
+def essential_dofs(mesh: mfem.Mesh,
+                   fespace: mfem.FiniteElementSpace) -> intArray:
+    """Returns the true dofs clamped by boundary attribute 1 (post base)"""
+    ess_tdof_list = intArray()
+    fespace.GetEssentialTrueDofs(clamped_boundary(mesh), ess_tdof_list)
+
+    return ess_tdof_list
+
+
+def pwj_load(mesh: mfem.Mesh,
+             fespace: mfem.FiniteElementSpace,
+             pwj_force: float) -> mfem.LinearForm:
+    """Assembles the PWJ traction in z on boundary attribute 2"""
+    dim = mesh.Dimension()
+    f = mfem.VectorArrayCoefficient(dim)
+    for i in range(dim-1):
+        f.Set(i, mfem.ConstantCoefficient(0.0))
+
+    pull_force = mfem.Vector([0] * mesh.bdr_attributes.Max())
+    pull_force[1] = pwj_force
+    f.Set(dim-1, mfem.PWConstCoefficient(pull_force))
+
+    b = mfem.LinearForm(fespace)
+    b.AddBoundaryIntegrator(mfem.VectorBoundaryLFIntegrator(f))
+    b.Assemble()
+
+    return b
+
+
 def get_components(coordinates:tuple[float, float, float],
                    mesh: mfem.Mesh, 
                    gf: mfem.GridFunction,
@@ -85,6 +264,278 @@ def get_components(coordinates:tuple[float, float, float],
     return components
 
 
+def solve_system(A: mfem.SparseMatrix,
+                 B: mfem.Vector,
+                 X: mfem.Vector,
+                 print_level: int=1,
+                 max_iter: int=500,
+                 rel_tol: float=1e-8) -> tuple[int, float]:
+    """PCG with a Gauss-Seidel smoother, returns (iterations, final norm)
+
+    Same as mfem.PCG(A, M, B, X, print_level, max_iter, rel_tol, 0.0), where
+    the tolerance is on the squared residual norm.
+    """
+    M = mfem.GSSmoother(A)
+    pcg = mfem.CGSolver()
+    pcg.SetPrintLevel(print_level)
+    pcg.SetMaxIter(max_iter)
+    pcg.SetRelTol(np.sqrt(rel_tol))
+    pcg.SetAbsTol(0.0)
+    pcg.SetOperator(A)
+    pcg.SetPreconditioner(M)
+    pcg.Mult(B, X)
+
+    return pcg.GetNumIterations(), pcg.GetFinalNorm()
+
+
+def single_operator(A: mfem.SparseMatrix) -> csr_array:
+    """float32 copy of the values of A, sharing its CSR index arrays"""
+    return csr_array((A.GetDataArray().astype(np.float32), A.GetJArray(),
+                      A.GetIArray()), shape=(A.Height(), A.Width()), copy=False)
+
+
+def chebyshev_jacobi(A: csr_array,
+                     degree: int=5,
+                     ratio: float=100.0,
+                     power_iter: int=20):
+    """Chebyshev polynomial preconditioner of D^-1 A, as M(r, z): z = M^-1 r
+
+    The float32 counterpart of the Chebyshev smoothers in multigrid.py, on
+    [lmax / ratio, lmax] with lmax estimated by power iteration. Each
+    application is degree - 1 products with A; from degree 5 PCG needs
+    fewer iterations than with symmetric GS.
+    """
+    n = A.shape[0]
+    inv_diag = 1.0 / A.diagonal()
+    v, Av = np.ones(n, dtype=A.dtype), np.empty(n, dtype=A.dtype)
+
+    lmax = 0.0
+    for _ in range(power_iter):
+        np.multiply(A @ v, inv_diag, out=Av)
+        lmax = np.linalg.norm(Av) / np.linalg.norm(v)
+        np.divide(Av, np.linalg.norm(Av), out=v)
+    upper = 1.1 * lmax
+    lower = upper / ratio
+    theta, delta = 0.5 * (upper + lower), 0.5 * (upper - lower)
+    sigma = theta / delta
+    d, res = v, Av
+
+    def apply(r, z):
+        np.multiply(inv_diag, r, out=d)
+        np.divide(d, theta, out=d)
+        z[:] = d
+        rho = 1.0 / sigma
+        for _ in range(degree - 1):
+            np.subtract(r, A @ z, out=res)
+            np.multiply(res, inv_diag, out=res)
+            rho_new = 1.0 / (2.0 * sigma - rho)
+            np.multiply(d, rho_new * rho, out=d)
+            np.multiply(res, 2.0 * rho_new / delta, out=res)
+            np.add(d, res, out=d)
+            z += d
+            rho = rho_new
+
+    return apply
+
+
+def pcg_single(A: csr_array,
+               M,
+               b: np.ndarray,
+               rel_tol: float,
+               max_iter: int) -> tuple[np.ndarray, int]:
+    """PCG in the precision of A and b, returns (x, iterations)
+
+    M(r, z) applies the preconditioner in place.
+    """
+    x = np.zeros_like(b)
+    r = b.copy()
+    z = np.empty_like(b)
+    M(r, z)
+    p = z.copy()
+    rz = r @ z
+    tol = rel_tol * rel_tol * rz
+    for i in range(max_iter):
+        if rz <= tol:
+            return x, i
+        Ap = A @ p
+        alpha = rz / (p @ Ap)
+        x += alpha * p
+        r -= alpha * Ap
+        M(r, z)
+        rz_new = r @ z
+        p *= rz_new / rz
+        p += z
+        rz = rz_new
+
+    return x, max_iter
+
+
+def solve_mixed(A: mfem.SparseMatrix,
+                B: mfem.Vector,
+                X: mfem.Vector,
+                print_level: int=1,
+                max_iter: int=500,
+                rel_tol: float=1e-8,
+                inner_tol: float=1e-3,
+                max_refine: int=20) -> tuple[int, float, int]:
+    """Mixed precision solve by iterative refinement
+
+    The corrections are solved by a float32 copy of A (PCG with a Chebyshev
+    preconditioner to inner_tol) and accumulated in float64 against the
+    float64 residual, until ||b - A x|| / ||b|| <= sqrt(rel_tol), the
+    solve_system tolerance. The inner solves only touch the float32 values
+    and the shared indices, MFEM forms the residual from the float64 A.
+    This is an accuracy mode: the true residual is guaranteed, unlike the
+    preconditioned norm of solve_system, but the NumPy inner iterations are
+    slower than MFEM's float64 PCG.
+    Returns (inner iterations, relative residual, refinements).
+    """
+    A_single = single_operator(A)
+    M = chebyshev_jacobi(A_single)
+
+    b_norm = B.Norml2()
+    r = mfem.Vector(B.Size())
+    x = X.GetDataArray()
+    iterations, refinements = 0, 0
+    residual = 0.0 if b_norm == 0.0 else np.inf
+    while b_norm > 0.0:
+        r.Assign(B)
+        A.AddMult(X, r, -1.0)
+        r_norm = r.Norml2()
+        residual = r_norm / b_norm
+        if print_level > 0:
+            print(f"Refinement {refinements} : ||r|| / ||b|| = {residual:0.3e}"
+                  + f" ({iterations} iterations)")
+        if residual <= np.sqrt(rel_tol) or refinements == max_refine:
+            break
+        # Scale the correction problem to avoid float32 under/overflow
+        d, its = pcg_single(A_single, M,
+                            (r.GetDataArray() / r_norm).astype(np.float32),
+                            inner_tol, max_iter)
+        x += r_norm * d
+        iterations += its
+        refinements += 1
+
+    return iterations, float(residual), refinements
+
+
+def relative_residual(A: mfem.SparseMatrix,
+                      B: mfem.Vector,
+                      X: mfem.Vector) -> float:
+    """||b - A x|| / ||b||, with the float64 A"""
+    b_norm = B.Norml2()
+    if b_norm == 0.0:
+        return 0.0
+    r = mfem.Vector(B)
+    A.AddMult(X, r, -1.0)
+
+    return r.Norml2() / b_norm
+
+
+def nearest_element(mesh: mfem.Mesh,
+                    point: tuple[float, float, float],
+                    tol: float=0.25,
+                    candidates: int=8) -> Union[tuple[int, mfem.IntegrationPoint], None]:
+    """Locates a point just outside of the faceted surface of the mesh
+
+    Gauges on the curved post surface can fall between the facets, where
+    FindPoints misses them. The point is projected on the tetrahedra around
+    its nearest vertices, and the closest projection is accepted if it is
+    within tol times the element size. Returns (element id, integration
+    point) or None.
+    """
+    vertices = np.array(mesh.GetVertexArray())
+    p = np.asarray(point, dtype=np.float64)
+    nearest = np.argsort(np.linalg.norm(vertices - p, axis=1))[:candidates]
+    table = mesh.GetVertexToElementTable()
+    best = None
+    for e in sorted({e for v in nearest for e in table.GetRowList(int(v))}):
+        if mesh.GetElementGeometry(e) != mfem.Geometry.TETRAHEDRON:
+            continue
+        X = vertices[mesh.GetElementVertices(e)]
+        xi = np.linalg.solve((X[1:] - X[0]).T, p - X[0])
+        # Barycentric coordinates, clipped into the element
+        lam = np.clip(np.concatenate([[1 - xi.sum()], xi]), 0.0, None)
+        lam /= lam.sum()
+        distance = np.linalg.norm(lam @ X - p)
+        if best is None or distance < best[0]:
+            best = (distance, e, lam[1:])
+    if best is None or best[0] > tol * mesh.GetElementSize(best[1]):
+        return None
+
+    ip = mfem.IntegrationPoint()
+    ip.Set3(*best[2])
+
+    return best[1], ip
+
+
+def locate_gauges(mesh: mfem.Mesh,
+                  gauges: dict=GAUGES,
+                  strict: bool=True) -> dict:
+    """Returns {name: (element id, integration point)} for each gauge
+
+    Gauges missed by FindPoints are located by nearest_element. Gauges still
+    outside of the mesh raise a ValueError, or are skipped if not strict.
+    """
+    names = list(gauges.keys())
+    if not names:
+        return {}
+    _, elem_ids, ips = mesh.FindPoints([gauges[k] for k in names], warn=False)
+    located = {}
+    for i, k in enumerate(names):
+        if elem_ids[i] < 0:
+            nearest = nearest_element(mesh, gauges[k])
+            if nearest is not None:
+                located[k] = nearest
+                continue
+            if not strict:
+                continue
+            raise ValueError(f"Gauge '{k}' at {gauges[k]} is outside of the mesh")
+        # Copy, the IntegrationPointArray from FindPoints is short lived
+        ip = mfem.IntegrationPoint()
+        ip.Set3(ips[i].x, ips[i].y, ips[i].z)
+        located[k] = (elem_ids[i], ip)
+
+    return located
+
+
+def gauge_strain(mesh: mfem.Mesh,
+                 u: mfem.GridFunction,
+                 located: dict,
+                 si: int=Z_HAT,
+                 sj: int=Z_HAT) -> dict:
+    """Evaluates strain(si, sj) of displacement u at the located gauges"""
+    grad = mfem.DenseMatrix()
+    strain = {}
+    for k, (elem_id, ip) in located.items():
+        T = mesh.GetElementTransformation(elem_id)
+        T.SetIntPoint(ip)
+        u.GetVectorGradient(T, grad)
+        strain[k] = 0.5 * (grad[si, sj] + grad[sj, si])
+
+    return strain
+
+
+def mirror_x(mesh: mfem.Mesh, u: mfem.GridFunction) -> None:
+    """Maps the nodal mesh and displacement in place to the PWJ at -x
+
+    The post and sample are axisymmetric and the PWJ is on y = 0, so the
+    solution for the PWJ at -x is the solution for +x rotated by pi about
+    the z axis, (x, y, z) -> (-x, -y, z). Unlike the reflection x -> -x the
+    rotation keeps the elements positively oriented. Requires
+    mesh.SetNodalFESpace.
+    """
+    for gf in (mesh.GetNodes(), u):
+        fes = gf.FESpace()
+        values = gf.GetDataArray()
+        ndofs = fes.GetNDofs()
+        if fes.GetOrdering() == mfem.Ordering.byNODES:
+            values[:2 * ndofs] *= -1
+        else:
+            values[0::fes.GetVDim()] *= -1
+            values[1::fes.GetVDim()] *= -1
+
+
 def save_mfem_data(fname: str,
                    pwj_pos: float,
                    mesh: mfem.Mesh,
@@ -102,6 +553,20 @@ def save_mfem_data(fname: str,
     strain.Save(f'{fname}_stain_{pos}.gf', 8)
 
 
+def save_npmesh_data(fname: str,
+                     pwj_pos: float,
+                     mesh: mfem.Mesh,
+                     u: mfem.GridFunction,
+                     strain: mfem.GridFunction):
+    """Binary counterpart of save_mfem_data, see npmesh.py"""
+    pos = f"{pwj_pos:+05.1f}mm"
+    path = f'{fname}_{pos}.npmesh'
+
+    save_mesh(path, mesh)
+    save_gridfunction(path, "displacement", u)
+    save_gridfunction(path, "strain", strain)
+
+
 def save_paraview_frame(fname: str,
                pwj_pos: float,
                mesh: mfem.Mesh,
@@ -134,137 +599,234 @@ def run_analysis(fname: str,
                  material_1: str="Ti6Al4V-G23",
                  dataname="experiment",
                  cycle: int=0,
-                 time: float=0.0):
+                 time: float=0.0,
+                 telemetry: Union[Telemetry, None]=None,
+                 quiet: bool=False,
+                 mirror: Union[tuple[int, float], None]=None,
+                 archive: Union[str, None]=None,
+                 reorder: Union[str, None]=None,
+                 mixed: bool=False,
+                 multigrid: Union[tuple[int, int], None]=None,
+                 operator_cache: Union[OperatorCache, None]=None,
+                 lame: Union[list, None]=None,
+                 prefix: str="../paraview") -> dict:
+    """Static solve for the PWJ at pwj_pos, writes a Paraview frame
+
+    Returns the solver statistics and the strain(z,z) at the GAUGES in the mesh.
+    If mirror is a (cycle, time) pair the rotated solution for the PWJ at
+    -pwj_pos is also written, and its gauge strains returned as "strain_mirror".
+    If archive is given the mesh and fields are also saved as *.npmesh.
+    reorder is one of REORDERINGS, applied to the mesh before the FE space.
+    mixed solves in float32 with float64 iterative refinement, see solve_mixed.
+    multigrid is (uniform refinements, order elevations) of the mesh, solved
+    on the finest level with an ElasticityMultigrid preconditioner.
+    operator_cache reuses the eliminated system matrix of earlier runs.
+    lame is [(lambda, mu)] per attribute in place of the material moduli.
+    prefix is the Paraview output directory.
+    """
+    if mixed and multigrid is not None:
+        raise ValueError("Mixed precision and multigrid solves are exclusive")
+    if operator_cache is not None and multigrid is not None:
+        raise ValueError("The operator cache does not hold multigrid hierarchies")
+    # Quiet mode drops the console output, including per iteration PCG output
+    log = (lambda *args, **kws: None) if quiet else print
+    if telemetry is None:
+        telemetry = Telemetry()
+
     order = 1
     # MFEM cannot handle pathlib objects
     meshfile = fname 
-    print(meshfile)
+    log(meshfile)
 
-    mesh = mfem.Mesh(meshfile, 1, 1)
+    with telemetry.phase("mesh_load"):
+        mesh = read_mesh(meshfile)
     dim = mesh.Dimension()
-    print(f"Dimensions: {dim}")
-
-    # Define a finite element space on the mesh.
-    fec = mfem.H1_FECollection(order, dim)
-    fespace = mfem.FiniteElementSpace(mesh, fec, dim)
-    print("Number of finite element unknowns: " + str(fespace.GetTrueVSize()))
-
-    # Deterimine list of true essential boundary degrees of freedom (dof).
-    ess_tdof_list = intArray()
-    ess_bdr = intArray([1]+[0]*(mesh.bdr_attributes.Max()-1))
-    fespace.GetEssentialTrueDofs(ess_bdr, ess_tdof_list)
-    print(f"Max Boundary Attributes (Domains): {mesh.bdr_attributes.Max()}")
-
-    # Set up the linear form b(.) which corresponds to the RHS of the FEM linear system.
-    # NOTE: The forcing function (pwj_force) needs to be in the same units
-    # as the Lame parameters, i.e., If the Lame parameters are in Pa, so must the forcing function.
-    f = mfem.VectorArrayCoefficient(dim)
-    for i in range(dim-1):
-        f.Set(i, mfem.ConstantCoefficient(0.0))
-
-    pull_force = mfem.Vector([0] * mesh.bdr_attributes.Max())
-    pull_force[1] = pwj_force
-    f.Set(dim-1, mfem.PWConstCoefficient(pull_force))
-
-    b = mfem.LinearForm(fespace)
-    b.AddBoundaryIntegrator(mfem.VectorBoundaryLFIntegrator(f))
-    print(f"RHS: b_i = "
-          + f"{lookup('INTEGRAL')} "
-          + "f"
-          + f"{lookup('DOT OPERATOR')}"
-          + f"{lookup('GREEK SMALL LETTER PHI')}_i")
-    b.Assemble()
-
-    # Define the solution vector x as a finite element grid function 
-    # corresponding to fespace. Assuming zero satisfies the B.C.
-    x = mfem.GridFunction(fespace)
-    x.Assign(0.0)
-
-
-    lamb_0 = lambda_shear(YOUNG_MOD[material_0], SHEAR_MOD[material_0])
-    lamb_1 = lambda_shear(YOUNG_MOD[material_1], SHEAR_MOD[material_1])
-
-    mu_0 = SHEAR_MOD[material_0]
-    mu_1 = SHEAR_MOD[material_1]
-
-    print(f"{material_0}  | {lookup('GREEK SMALL LETTER LAMDA')}_0 : {lamb_0:0.3g} | {lookup('GREEK SMALL LETTER MU')}_0 : {mu_0:0.3g}")
-    print(f"{material_1}  | {lookup('GREEK SMALL LETTER LAMDA')}_1 : {lamb_1:0.3g} | {lookup('GREEK SMALL LETTER MU')}_1 : {mu_1:0.3g}")
-
-    # Bilinear form of a(., .) on the finite element space corresponding to the 
-    # linear elasticity integrator with piece-wise constants coefficient 
-    # lambda (lamb) and mu.
-    print(f"Max Attributes: {mesh.attributes.Max()}")
-    lamb = mfem.Vector(mesh.attributes.Max())
-    lamb.Assign(1.0)
-    lamb[0] *= lamb_0
-    lamb[1] *= lamb_1
-    lamb_coef = mfem.PWConstCoefficient(lamb)
-
-    mu = mfem.Vector(mesh.attributes.Max())
-    mu.Assign(1.0)
-    mu[0] *= mu_0
-    mu[1] *= mu_1
-    mu_coef = mfem.PWConstCoefficient(mu)
-
-    a = mfem.BilinearForm(fespace)
-    a.AddDomainIntegrator(mfem.ElasticityIntegrator(lamb_coef, mu_coef))
-
-    # Assemble the bilinear form and corresponding linear system
-    print(f"LHS: A_ij = "
-          + f"{lookup('INTEGRAL')} "
-          + f"{lookup('NABLA')}({lookup('GREEK SMALL LETTER PHI')}_i)"
-          + f"{lookup('DOT OPERATOR')}"
-          + f"{lookup('NABLA')}({lookup('GREEK SMALL LETTER PHI')}_j)")
-    static_cond = False
-    if (static_cond):
-        a.EnableStaticCondensation()
-    a.Assemble()
-
-    A = mfem.OperatorPtr()
-    B = mfem.Vector()
-    X = mfem.Vector()
-    a.FormLinearSystem(ess_tdof_list, x, b, A, X, B)
-    print('Size of linear system: ' + str(A.Height()))
+    log(f"Dimensions: {dim}")
+
+    if reorder is not None:
+        with telemetry.phase("reorder"):
+            reorder_mesh(mesh, reorder)
+        log(f"Reordered elements ({reorder})")
+
+    with telemetry.phase("assembly"):
+        # Define a finite element space on the mesh.
+        fec = mfem.H1_FECollection(order, dim)
+        # Interleave the components of a node when optimizing for locality
+        ordering = mfem.Ordering.byNODES if reorder is None else mfem.Ordering.byVDIM
+        fespace = mfem.FiniteElementSpace(mesh, fec, dim, ordering)
+        if multigrid is not None:
+            # The hierarchy only references the coarse mesh and space
+            coarse_mesh, coarse_space = mesh, fespace
+            fespaces, collections = elasticity_hierarchy(coarse_space, *multigrid)
+            fespace = fespaces.GetFinestFESpace()
+            mesh = fespace.GetMesh()
+            fec = fespace.FEColl()
+            log(f"Multigrid levels: {fespaces.GetNumLevels()}")
+        log("Number of finite element unknowns: " + str(fespace.GetTrueVSize()))
+
+        # Deterimine list of true essential boundary degrees of freedom (dof).
+        ess_tdof_list = essential_dofs(mesh, fespace)
+        log(f"Max Boundary Attributes (Domains): {mesh.bdr_attributes.Max()}")
+
+        # Set up the linear form b(.) which corresponds to the RHS of the FEM linear system.
+        # NOTE: The forcing function (pwj_force) needs to be in the same units
+        # as the Lame parameters, i.e., If the Lame parameters are in Pa, so must the forcing function.
+        log(f"RHS: b_i = "
+            + f"{lookup('INTEGRAL')} "
+            + "f"
+            + f"{lookup('DOT OPERATOR')}"
+            + f"{lookup('GREEK SMALL LETTER PHI')}_i")
+        b = pwj_load(mesh, fespace, pwj_force)
+
+        # Define the solution vector x as a finite element grid function 
+        # corresponding to fespace. Assuming zero satisfies the B.C.
+        x = mfem.GridFunction(fespace)
+        x.Assign(0.0)
+
+        # Bilinear form of a(., .) on the finite element space corresponding to the 
+        # linear elasticity integrator with piece-wise constants coefficient 
+        # lambda (lamb) and mu.
+        if lame is None:
+            lamb_coef, mu_coef = lame_coefficients(mesh, material_0, material_1,
+                                                   verbose=not quiet)
+            lame = lame_parameters(mesh, material_0, material_1)
+        else:
+            lamb_coef, mu_coef = lame_piecewise(mesh, lame)
+            n = mesh.attributes.Max()
+            lame = (list(lame) + [(1.0, 1.0)] * n)[:n]
+
+        # Assemble the bilinear form and corresponding linear system
+        log(f"LHS: A_ij = "
+            + f"{lookup('INTEGRAL')} "
+            + f"{lookup('NABLA')}({lookup('GREEK SMALL LETTER PHI')}_i)"
+            + f"{lookup('DOT OPERATOR')}"
+            + f"{lookup('NABLA')}({lookup('GREEK SMALL LETTER PHI')}_j)")
+        A = mfem.OperatorPtr()
+        B = mfem.Vector()
+        X = mfem.Vector()
+        cached = None
+        if operator_cache is not None and fespace.Conforming():
+            key = operator_cache.key(meshfile, fespace, lame,
+                                     clamped_boundary(mesh), reorder)
+            cached = operator_cache.load(key)
+            telemetry.set(operator_cache="miss" if cached is None else "hit")
+        if cached is not None:
+            # The clamp is homogeneous and there is no prolongation, so the
+            # eliminated system is A X = b with b zeroed on the clamped dofs
+            log("Using cached operator")
+            AA, ess_tdof_list = cached
+            B = mfem.Vector(b)
+            B.SetSubVector(ess_tdof_list, 0.0)
+            X = mfem.Vector(x)
+        elif multigrid is not None:
+            # Assembles every level, the finest one is the system
+            M = ElasticityMultigrid(fespaces, clamped_boundary(mesh),
+                                    lamb_coef, mu_coef)
+            M.FormFineLinearSystem(x, b, A, X, B)
+        else:
+            a = mfem.BilinearForm(fespace)
+            a.AddDomainIntegrator(mfem.ElasticityIntegrator(lamb_coef, mu_coef))
+            static_cond = False
+            if (static_cond):
+                a.EnableStaticCondensation()
+            a.Assemble()
+
+            a.FormLinearSystem(ess_tdof_list, x, b, A, X, B)
+        if cached is None:
+            AA = mfem.OperatorHandle2SparseMatrix(A)
+            if operator_cache is not None and fespace.Conforming():
+                operator_cache.save(key, AA, ess_tdof_list)
+    log('Size of linear system: ' + str(AA.Height()))
+
+    telemetry.set(reorder=reorder, bandwidth=bandwidth(AA))
 
     # Solve
-    AA = mfem.OperatorHandle2SparseMatrix(A)
-    M = mfem.GSSmoother(AA)
-    mfem.PCG(AA, M, B, X, 1, 500, 1e-8, 0.0)
-
-    # Recover the solution as a finite element grid function
-    A.RecoverFEMSolution(X, b, x)
-
-    # For non-NURBS meshs, make the mesh curved based on the
-    # finite element space. Meaning, we define the mesh elements
-    # through a fespace based transormation of the reference element.
-    # This allows us to save the displaced mesh as a curved mesh 
-    # when using high-order finte element displacement field.
-    if not mesh.NURBSext:
-        print("Setting Nodal FE Space")
-        mesh.SetNodalFESpace(fespace)
-
-    # 14. Save the displacement mesh and the inverted solution (which
-    #     gives the backwards displacements to the original grid). 
-    #     this output can be view later using GLVis 
-    scalar_space = mfem.FiniteElementSpace(mesh, fec)
-
-    strain = mfem.GridFunction(scalar_space)
-    strain_coef = StrainCoefficient()
-    strain_coef.SetDisplacement(x)
-
-    #stress = mfem.GridFunction(scalar_dg_space)
-    #stress_coef = StressCoefficient(lamb_coef, mu_coef)
-    #stress_coef.SetDisplacement(x)
-
-    strain_coef.SetComponent(2, 2)
-    strain.ProjectCoefficient(strain_coef)
-
-    #stress_coef.SetComponent(z_hat, z_hat)
-    #stress.ProjectCoefficient(stress_coef)
-
-    print("Saving MFEM data")
-    #save_mfem_data("test", pwj_pos, mesh, x, strain)
-    save_paraview_frame(dataname, pwj_pos, mesh, x, strain, cycle, time) 
+    with telemetry.phase("solve"):
+        if mixed:
+            iterations, final_norm, refinements = solve_mixed(
+                AA, B, X, print_level=0 if quiet else 1)
+            telemetry.set(refinements=refinements)
+        elif multigrid is not None:
+            iterations, final_norm = solve_multigrid(AA, M, B, X,
+                                                     print_level=0 if quiet else 1)
+        else:
+            iterations, final_norm = solve_system(AA, B, X,
+                                                  print_level=0 if quiet else 1)
+
+        # Recover the solution as a finite element grid function
+        if cached is not None:
+            x.Assign(X)
+        elif multigrid is not None:
+            M.RecoverFineFEMSolution(X, b, x)
+        else:
+            A.RecoverFEMSolution(X, b, x)
+    results = {
+        "elements": mesh.GetNE(),
+        "dofs": fespace.GetTrueVSize(),
+        "iterations": iterations,
+        "final_norm": final_norm,
+        # Achieved accuracy, ||b - A x|| / ||b|| in float64
+        "residual": relative_residual(AA, B, X),
+        # ||u||_A = sqrt(u^T A u) = sqrt(b(u)), with u = 0 on the clamped dofs
+        "energy_norm": float(np.sqrt(abs(mfem.InnerProduct(b, x)))),
+    }
+    telemetry.set(**results)
+
+    with telemetry.phase("projection"):
+        # Probe before the mesh nodes are replaced by the nodal FE space
+        located = locate_gauges(mesh, strict=False)
+        results["strain"] = gauge_strain(mesh, x, located)
+        if mirror is not None:
+            # strain(z,z) is unchanged by the rotation, probe the rotated
+            # gauges, every gauge of the step has its mirror image
+            gauges = {k: (-GAUGES[k][0], -GAUGES[k][1], GAUGES[k][2])
+                      for k in results["strain"]}
+            located = locate_gauges(mesh, gauges)
+            results["strain_mirror"] = gauge_strain(mesh, x, located)
+
+        # For non-NURBS meshs, make the mesh curved based on the
+        # finite element space. Meaning, we define the mesh elements
+        # through a fespace based transormation of the reference element.
+        # This allows us to save the displaced mesh as a curved mesh 
+        # when using high-order finte element displacement field.
+        if not mesh.NURBSext:
+            log("Setting Nodal FE Space")
+            mesh.SetNodalFESpace(fespace)
+
+        # 14. Save the displacement mesh and the inverted solution (which
+        #     gives the backwards displacements to the original grid). 
+        #     this output can be view later using GLVis 
+        scalar_space = mfem.FiniteElementSpace(mesh, fec)
+
+        strain = mfem.GridFunction(scalar_space)
+        strain_coef = StrainCoefficient()
+        strain_coef.SetDisplacement(x)
+
+        #stress = mfem.GridFunction(scalar_dg_space)
+        #stress_coef = StressCoefficient(lamb_coef, mu_coef)
+        #stress_coef.SetDisplacement(x)
+
+        strain_coef.SetComponent(2, 2)
+        strain.ProjectCoefficient(strain_coef)
+
+        #stress_coef.SetComponent(z_hat, z_hat)
+        #stress.ProjectCoefficient(stress_coef)
+
+    log("Saving MFEM data")
+    with telemetry.phase("output"):
+        #save_mfem_data("test", pwj_pos, mesh, x, strain)
+        save_paraview_frame(dataname, pwj_pos, mesh, x, strain, cycle, time,
+                            prefix)
+        if archive is not None:
+            save_npmesh_data(archive, pwj_pos, mesh, x, strain)
+
+        if mirror is not None:
+            mirror_cycle, mirror_time = mirror
+            mirror_x(mesh, x)
+            save_paraview_frame(dataname, -pwj_pos, mesh, x, strain,
+                                mirror_cycle, mirror_time, prefix)
+
+    return results
 
 
 if __name__ == "__main__":
@@ -275,13 +837,37 @@ if __name__ == "__main__":
                         help="Sample material defined in {YOUNG,SHEAR}_MOD")
     parser.add_argument("-p", "--pressure", type=float, default=-31.03E6,
                         help="Applied pressure in Pa")
+    parser.add_argument("-t", "--telemetry", type=str, default=None,
+                        help="Write per phase timings to a JSON lines file")
+    parser.add_argument("-q", "--quiet", action="store_true", default=False,
+                        help="Suppress console output")
+    parser.add_argument("-r", "--reorder", type=str, default=None, choices=REORDERINGS,
+                        help=REORDER_HELP)
+    parser.add_argument("--mixed", action="store_true", default=False,
+                        help="Mixed precision solve to a float64 residual tolerance,"
+                             + " an accuracy mode, slower than the default solve")
+    parser.add_argument("--multigrid", type=int, nargs=2, default=None,
+                        metavar=("REFINEMENTS", "ORDERS"),
+                        help="Multigrid solve on the mesh refined and order elevated")
+    parser.add_argument("--operator-cache", type=str, nargs="?", default=None,
+                        const=str(CACHE_DIR), metavar="DIR",
+                        help=f"Reuse assembled operators (dflt: {CACHE_DIR})")
 
     args = parser.parse_args()
 
+    telemetry = Telemetry(args.telemetry)
     run_analysis(args.mesh,
                  args.pressure, 
                  0,
                  material_1=args.sample_material,
-                 dataname="test")
+                 dataname="test",
+                 telemetry=telemetry,
+                 quiet=args.quiet,
+                 reorder=args.reorder,
+                 mixed=args.mixed,
+                 multigrid=args.multigrid,
+                 operator_cache=None if args.operator_cache is None
+                                else OperatorCache(args.operator_cache))
+    telemetry.write(mesh=args.mesh)
 
     print("Finished.")
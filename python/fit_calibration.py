@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# Copyright 2023 David Kalliecharan <dave@dal.ca>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS “AS IS”
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE
+
+"""Fit the effective pressure scale and/or sample modulus to gauge readings
+
+The response is linear in the load, so the gauge strain at pressure P is
+k * P * r(s), where r(s) is the gauge strain per Pa with the sample moduli
+scaled by s. r(s) is solved once on a few scales, cached, and interpolated;
+the fit never re-meshes or re-solves.
+
+The measurements are a CSV with the columns "Pressure (Pa)", "Position"
+(bot, mid, top or mean) and one of "Strain" (strain(z,z), as simulated),
+"Sensor Strain" or "Voltage (V)". The gauge circuit reads -strain(z,z), the
+sensor readings are flipped to the sign of the simulation before the fit.
+"""
+
+import numpy as np
+
+# MFEM v4.5 uses deprecated numpy variable numpy.long
+major, minor, micro = [int(v) for v in np.__version__.split('.')]
+if major == 1 and micro > 23:
+    np.long = np.longlong
+
+from argparse import ArgumentParser
+from fea import (
+    SHEAR_MOD,
+    YOUNG_MOD,
+    lambda_shear,
+    run_analysis,
+)
+from hashlib import sha256
+import json
+from mesh import generate_mesh
+import pandas as pd
+from pathlib import Path
+from rich import print
+from sys import exit
+from tempfile import TemporaryDirectory
+
+
+ROOT = Path(".").absolute().parent
+
+FITS = ["pressure", "modulus", "both"]
+
+# Sensor Strain = Strain * -1 for the gauge circuit, see nb/strain.ipynb
+SENSOR_SIGN = -1
+
+
+def scaled_lame(sample_material: str,
+                scale: float,
+                post_material: str="Al 6061-T6") -> list:
+    """[(lambda, mu)] of the post and the sample, both sample moduli scaled
+
+    Scaling E and G together keeps Poisson's ratio, so lambda scales too.
+    """
+    lame = []
+    for material, s in ((post_material, 1.0), (sample_material, scale)):
+        E, G = YOUNG_MOD[material], SHEAR_MOD[material]
+        lame.append((s * lambda_shear(E, G), s * G))
+
+    return lame
+
+
+def measured_strain(measurements: pd.DataFrame,
+                    gain: float=None) -> np.ndarray:
+    """strain(z,z) of the readings, in the sign convention of the simulation
+
+    "Strain" is used as is, "Sensor Strain" and "Voltage (V)" / gain are
+    sensor readings and multiplied by SENSOR_SIGN.
+    """
+    if "Strain" in measurements.columns:
+        return measurements["Strain"].values
+    if "Sensor Strain" in measurements.columns:
+        return SENSOR_SIGN * measurements["Sensor Strain"].values
+    if gain is None:
+        raise ValueError("Voltage readings need a gain")
+
+    return SENSOR_SIGN * measurements["Voltage (V)"].values / gain
+
+
+def unit_responses(geofile: str,
+                   size: float,
+                   sample_material: str,
+                   scales: list,
+                   cache: str=None) -> pd.DataFrame:
+    """Gauge strain per Pa for each modulus scale, meshing once
+
+    Returns a table indexed by scale with a column per gauge and "mean".
+    """
+    with open(geofile, "rb") as f:
+        digest = sha256(f.read())
+    digest.update(json.dumps([size, sample_material, sorted(scales)]).encode())
+    key = digest.hexdigest()
+
+    cached = {}
+    if cache is not None and Path(cache).exists():
+        with open(cache, "r") as f:
+            cached = json.load(f)
+        if key in cached:
+            print(f"Using cached unit responses from {cache}")
+            return pd.DataFrame(cached[key]["responses"]).set_index("scale")
+
+    records = []
+    with TemporaryDirectory() as tmp:
+        meshfile = str(Path(tmp) / "calibration.msh")
+        generate_mesh(geofile, meshfile, size, quiet=True)
+        for s in sorted(scales):
+            print(f"Unit load response with sample moduli x{s:g}")
+            results = run_analysis(
+                meshfile,
+                1.0,
+                0,
+                lame=scaled_lame(sample_material, s),
+                dataname="unit",
+                prefix=tmp,
+                quiet=True,
+            )
+            strain = results["strain"]
+            if not strain:
+                raise ValueError("No gauges are inside of the mesh")
+            records.append({"scale": s, **strain,
+                            "mean": float(np.mean(list(strain.values())))})
+
+    if cache is not None:
+        cached[key] = {
+            "geofile": str(geofile),
+            "size": size,
+            "sample_material": sample_material,
+            "responses": records,
+        }
+        with open(cache, "w") as f:
+            json.dump(cached, f, indent=2)
+
+    return pd.DataFrame(records).set_index("scale")
+
+
+def response_model(responses: pd.DataFrame, position: str):
+    """r(s) for a gauge, quadratic in log(s) through the sampled scales"""
+    s = np.log(responses.index.values)
+    r = responses[position].values
+    deg = min(2, len(s) - 1)
+    coef = np.polyfit(s, r, deg)
+
+    return lambda scale: np.polyval(coef, np.log(scale))
+
+
+def fit(measurements: pd.DataFrame,
+        responses: pd.DataFrame,
+        which: str="pressure",
+        max_iter: int=50) -> dict:
+    """Least squares fit of k and/or s with their standard uncertainties"""
+    if which not in FITS:
+        raise ValueError(f"Unknown fit '{which}', use one of {FITS}")
+
+    P = measurements["Pressure (Pa)"].values
+    y = measurements["Strain"].values
+    models = {p: response_model(responses, p)
+              for p in measurements["Position"].unique()}
+    positions = measurements["Position"].values
+
+    def predict(k, s):
+        r = np.array([models[p](s) for p in positions])
+        return k * P * r
+
+    if which == "pressure":
+        # Linear in k
+        a = predict(1.0, 1.0)
+        k = a @ y / (a @ a)
+        theta, J = np.array([k]), a[:, None]
+        residuals = y - k * a
+    else:
+        # Gauss-Newton on (k, log s), or log s alone
+        theta = np.array([1.0, 0.0]) if which == "both" else np.array([0.0])
+        unpack = ((lambda t: (t[0], np.exp(t[1]))) if which == "both"
+                  else (lambda t: (1.0, np.exp(t[0]))))
+        for _ in range(max_iter):
+            f0 = predict(*unpack(theta))
+            residuals = y - f0
+            J = np.empty((len(y), len(theta)))
+            for i in range(len(theta)):
+                step = 1e-6 * max(1.0, abs(theta[i]))
+                t = theta.copy()
+                t[i] += step
+                J[:, i] = (predict(*unpack(t)) - f0) / step
+            delta, *_ = np.linalg.lstsq(J, residuals, rcond=None)
+            theta = theta + delta
+            if np.all(np.abs(delta) < 1e-10 * (1 + np.abs(theta))):
+                break
+        residuals = y - predict(*unpack(theta))
+
+    dof = max(len(y) - len(theta), 1)
+    sigma2 = residuals @ residuals / dof
+    cov = sigma2 * np.linalg.pinv(J.T @ J)
+    stderr = np.sqrt(np.diag(cov))
+
+    results = {"rms": float(np.sqrt(residuals @ residuals / len(y))), "n": len(y)}
+    if which == "pressure":
+        results["pressure_scale"] = (float(theta[0]), float(stderr[0]))
+    elif which == "modulus":
+        s = np.exp(theta[0])
+        results["modulus_scale"] = (float(s), float(s * stderr[0]))
+    else:
+        s = np.exp(theta[1])
+        results["pressure_scale"] = (float(theta[0]), float(stderr[0]))
+        results["modulus_scale"] = (float(s), float(s * stderr[1]))
+        # Correlation, k and s trade off when the gauges respond alike
+        results["correlation"] = float(cov[0, 1] / (stderr[0] * stderr[1]))
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("measurements", type=str,
+                        help="Measured gauge readings (csv)")
+    parser.add_argument("-g", "--geofile", type=str,
+                        default=str(ROOT / "gmsh/system.calibration.geo"),
+                        help="Calibration geo file")
+    parser.add_argument("-f", "--fit", type=str, default="pressure", choices=FITS,
+                        help="Parameters to fit")
+    parser.add_argument("-m", "--sample-material", type=str, default="Ti6Al4V-G23",
+                        help="Sample material defined in {YOUNG,SHEAR}_MOD")
+    parser.add_argument("-s", "--size", type=float, default=0.1,
+                        help="Mesh Size Factor (dflt: 0.1)")
+    parser.add_argument("--scales", type=float, nargs="+",
+                        default=[0.7, 0.85, 1.0, 1.15, 1.3],
+                        help="Sample modulus scales for the unit responses")
+    parser.add_argument("--gain", type=float, default=None,
+                        help="Gauge circuit gain in V per sensor strain, for voltages")
+    parser.add_argument("--cache", type=str, default="../data/unit_response.json",
+                        help="Unit response cache (json)")
+
+    args = parser.parse_args()
+
+    measurements = pd.read_csv(args.measurements)
+    try:
+        measurements["Strain"] = measured_strain(measurements, args.gain)
+    except ValueError:
+        print("[red]Voltage readings need --gain[/red]")
+        exit(1)
+
+    scales = [1.0] if args.fit == "pressure" else args.scales
+    responses = unit_responses(args.geofile, args.size, args.sample_material,
+                               scales, cache=args.cache)
+    print(responses)
+
+    results = fit(measurements, responses, args.fit)
+    if "pressure_scale" in results:
+        k, dk = results["pressure_scale"]
+        print(f"Pressure scale : {k:0.4f} ± {dk:0.4f}")
+    if "modulus_scale" in results:
+        s, ds = results["modulus_scale"]
+        E = YOUNG_MOD[args.sample_material]
+        print(f"Modulus scale  : {s:0.4f} ± {ds:0.4f}"
+              + f" | E : {s * E:0.4g} ± {ds * E:0.2g} Pa")
+    if "correlation" in results:
+        print(f"Correlation    : {results['correlation']:0.3f}")
+    print(f"RMS residual   : {results['rms']:0.3g} (n = {results['n']})")
+
+    print("Finished.")
@@ -25,6 +25,7 @@
 
 from argparse import ArgumentParser
 import gmsh
+import numpy as np
 from pathlib import Path
 import re
 from sys import exit
@@ -100,6 +101,8 @@ def update_pwj_parameters(
     outfile = kws.setdefault("outfile", "output.geo")
     """Updates the pwj radius, and (x, y) position in the geo file"""
     debug = kws.setdefault("debug", False)
+    quiet = kws.setdefault("quiet", False)
+    log = (lambda *args, **kws: None) if quiet else print
 
     with open(infile, "r") as f:
         geoscript = f.read()
@@ -117,7 +120,7 @@ def update_pwj_parameters(
     x_old, y_old, z_old, radius_old, angle1_old, angle2_old, = parameters
     for i, j in zip(["x", "y", "pwj_r", "sample_r"],
                     (x_old, y_old, radius_old, sample_radius)):
-        print(f"{i} : {j} mm")
+        log(f"{i} : {j} mm")
 
     # Update PWJ area with new values
     pwj_comp = pwj_str.split(",")
@@ -126,12 +129,12 @@ def update_pwj_parameters(
     pwj_comp[COMPONENT["radius"]] = pwj_comp[COMPONENT["radius"]].replace(radius_old, " " + str(radius))
     pwj_str_updated = ",".join(pwj_comp)
 
-    print()
+    log()
     if debug:
         print(geoscript.replace(pwj_str, pwj_str_updated))
         exit()
     else:
-        print(pwj_str_updated)
+        log(pwj_str_updated)
 
     with open(outfile, "w") as f:
         f.write(geoscript.replace(pwj_str, pwj_str_updated))
@@ -156,19 +159,77 @@ def redefine_pwj_curves(geofile: str, curve_loop: str) -> None:
         f.write(geoscript.replace(curve_loop_old, curve_loop))
 
 
-def generate_mesh(geofile: str, meshfile: str, size: float) -> None:
-    gmsh.initialize()
+# gmsh element types for linear tetrahedra/triangles and their vertex count
+GMSH_TETRAHEDRON = (4, 4)
+GMSH_TRIANGLE = (2, 3)
+
+
+def gmsh_physical_elements(dim: int, element_type: tuple[int, int]) -> tuple:
+    """Connectivity (gmsh node tags) and physical tags of the current model"""
+    etype, nodes_per = element_type
+    connectivity, attributes = [], []
+    for _, tag in gmsh.model.getPhysicalGroups(dim):
+        for entity in gmsh.model.getEntitiesForPhysicalGroup(dim, tag):
+            types, _, nodes = gmsh.model.mesh.getElements(dim, entity)
+            for t, n in zip(types, nodes):
+                if t != etype:
+                    raise ValueError(f"Only linear elements are supported, found type {t}")
+                n = np.asarray(n, dtype=np.int64).reshape(-1, nodes_per)
+                connectivity.append(n)
+                attributes.append(np.full(len(n), tag, dtype=np.int32))
+
+    return np.concatenate(connectivity), np.concatenate(attributes)
+
 
-    gmsh.option.setNumber("Mesh.MshFileVersion", 2.2)
-    gmsh.option.setNumber("Mesh.MeshSizeFactor", size)
+def write_npmesh(meshfile: str) -> None:
+    """Writes the current gmsh model as a *.npmesh without a text round trip
 
-    gmsh.clear()
-    gmsh.open(geofile)
+    Like MFEM's gmsh reader, only elements in physical groups are kept and
+    their physical tags become the (boundary) attributes.
+    """
+    from npmesh import save_arrays
+    import mfem.ser as mfem
 
-    gmsh.model.mesh.generate(3)
-    gmsh.write(meshfile)
+    node_tags, coords, _ = gmsh.model.mesh.getNodes()
+    node_tags = np.asarray(node_tags, dtype=np.int64)
+    coords = np.asarray(coords).reshape(-1, 3)
 
-    gmsh.finalize()
+    elements, attributes = gmsh_physical_elements(3, GMSH_TETRAHEDRON)
+    boundary, bdr_attributes = gmsh_physical_elements(2, GMSH_TRIANGLE)
+
+    # Renumber the used gmsh node tags to contiguous vertex indices
+    used = np.unique(elements)
+    order = np.argsort(node_tags)
+    vertices = coords[order[np.searchsorted(node_tags[order], used)]]
+    elements = np.searchsorted(used, elements)
+    boundary = np.searchsorted(used, boundary)
+
+    save_arrays(meshfile, vertices, elements, attributes, boundary,
+                bdr_attributes, 3,
+                mfem.Geometry.TETRAHEDRON, mfem.Geometry.TRIANGLE)
+
+
+def generate_mesh(geofile: str, meshfile: str, size: float,
+                  quiet: bool=False) -> None:
+    gmsh.initialize()
+    try:
+        if quiet:
+            gmsh.option.setNumber("General.Terminal", 0)
+        gmsh.option.setNumber("Mesh.MshFileVersion", 2.2)
+
+        gmsh.clear()
+        gmsh.open(geofile)
+        # After opening, a <geofile>.opt next to the geo file sets its own size
+        gmsh.option.setNumber("Mesh.MeshSizeFactor", size)
+
+        gmsh.model.mesh.generate(3)
+        if meshfile.endswith(".npmesh"):
+            write_npmesh(meshfile)
+        else:
+            gmsh.write(meshfile)
+    finally:
+        # A failed mesh must not leave gmsh initialized for the next one
+        gmsh.finalize()
 
 
 if __name__ == "__main__":
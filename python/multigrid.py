@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# Copyright 2023 David Kalliecharan <dave@dal.ca>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS “AS IS”
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE
+
+
+"""Geometric and p-multigrid preconditioner for the elasticity system
+
+The hierarchy starts from the (coarse) gmsh mesh and adds levels by uniform
+refinement and then by order elevation. Each level is smoothed by Chebyshev
+iterations on its assembled operator and the coarsest level is solved
+directly (UMFPack), or by a tightly converged PCG without SuiteSparse.
+"""
+
+import numpy as np
+
+# MFEM v4.5 uses deprecated numpy variable numpy.long
+major, minor, micro = [int(v) for v in np.__version__.split('.')]
+if major == 1 and micro > 23:
+    np.long = np.longlong
+
+import mfem.ser as mfem
+
+
+def elasticity_hierarchy(coarse_space: mfem.FiniteElementSpace,
+                         refinements: int=1,
+                         order_refinements: int=0) -> tuple:
+    """Returns the (hierarchy, FE collections) on top of coarse_space
+
+    The refined meshes and spaces are owned by the hierarchy, coarse_space
+    and the returned collections must outlive it.
+    """
+    mesh = coarse_space.GetMesh()
+    dim = coarse_space.GetVDim()
+    ordering = coarse_space.GetOrdering()
+    order = coarse_space.GetMaxElementOrder()
+
+    fespaces = mfem.FiniteElementSpaceHierarchy(mesh, coarse_space, False, False)
+    for _ in range(refinements):
+        fespaces.AddUniformlyRefinedLevel(dim, ordering)
+
+    collections = []
+    for level in range(order_refinements):
+        collections.append(mfem.H1_FECollection(order + level + 1, mesh.Dimension()))
+        fespaces.AddOrderRefinedLevel(collections[-1], dim, ordering)
+
+    return fespaces, collections
+
+
+class ElasticityMultigrid(mfem.PyGeometricMultigrid):
+    """V-cycle preconditioner for the ElasticityIntegrator system
+
+    Assembles the bilinear form on every level of fespaces, the finest one
+    is used by FormFineLinearSystem.
+    """
+    def __init__(self,
+                 fespaces: mfem.FiniteElementSpaceHierarchy,
+                 ess_bdr: mfem.intArray,
+                 lamb_coef: mfem.Coefficient,
+                 mu_coef: mfem.Coefficient,
+                 chebyshev_order: int=2,
+                 coarse_tol: float=1e-10):
+        mfem.PyGeometricMultigrid.__init__(self, fespaces, ess_bdr)
+        self.lamb_coef = lamb_coef
+        self.mu_coef = mu_coef
+        # The levels only hold pointers to the operators and solvers
+        self.keep = []
+
+        self.coarse_level(fespaces.GetFESpaceAtLevel(0), ess_bdr, coarse_tol)
+        for level in range(1, fespaces.GetNumLevels()):
+            self.smoothed_level(fespaces.GetFESpaceAtLevel(level), ess_bdr,
+                                chebyshev_order)
+
+        self.SetCycleType(mfem.Multigrid.CycleType_VCYCLE, 1, 1)
+
+    def bilinear_form(self,
+                      fespace: mfem.FiniteElementSpace,
+                      ess_bdr: mfem.intArray) -> tuple:
+        """Returns the eliminated (operator, form, essential true dofs)"""
+        form = mfem.BilinearForm(fespace)
+        form.AddDomainIntegrator(mfem.ElasticityIntegrator(self.lamb_coef,
+                                                           self.mu_coef))
+        # Unit diagonal on the clamped dofs, the Chebyshev smoother sets its
+        # inverse diagonal to 1 there and would overestimate the spectrum
+        form.SetDiagonalPolicy(mfem.Operator.DIAG_ONE)
+        form.Assemble()
+        self.AppendBilinearForm(form)
+
+        ess_tdof_list = mfem.intArray()
+        fespace.GetEssentialTrueDofs(ess_bdr, ess_tdof_list)
+        self.keep.append(ess_tdof_list)
+
+        A = mfem.OperatorPtr()
+        form.FormSystemMatrix(ess_tdof_list, A)
+        A.SetOperatorOwner(False)
+        self.keep.append(A)
+
+        return A, form, ess_tdof_list
+
+    def coarse_level(self,
+                     fespace: mfem.FiniteElementSpace,
+                     ess_bdr: mfem.intArray,
+                     tol: float) -> None:
+        A, _, _ = self.bilinear_form(fespace, ess_bdr)
+        AA = mfem.OperatorHandle2SparseMatrix(A)
+        if hasattr(mfem, "UMFPackSolver"):
+            solver = mfem.UMFPackSolver()
+        else:
+            M = mfem.GSSmoother(AA)
+            self.keep.append(M)
+            solver = mfem.CGSolver()
+            solver.SetRelTol(tol)
+            solver.SetAbsTol(0.0)
+            solver.SetMaxIter(2000)
+            solver.SetPrintLevel(-1)
+            solver.SetPreconditioner(M)
+        solver.SetOperator(AA)
+        self.keep.append(solver)
+        self.AddLevel(A.Ptr(), solver, False, False)
+
+    def smoothed_level(self,
+                       fespace: mfem.FiniteElementSpace,
+                       ess_bdr: mfem.intArray,
+                       chebyshev_order: int) -> None:
+        A, form, ess_tdof_list = self.bilinear_form(fespace, ess_bdr)
+        diag = mfem.Vector(fespace.GetTrueVSize())
+        form.AssembleDiagonal(diag)
+        self.keep.append(diag)
+        smoother = mfem.OperatorChebyshevSmoother(A.Ptr(), diag, ess_tdof_list,
+                                                  chebyshev_order)
+        self.keep.append(smoother)
+        self.AddLevel(A.Ptr(), smoother, False, False)
+
+
+def solve_multigrid(A: mfem.Operator,
+                    M: ElasticityMultigrid,
+                    B: mfem.Vector,
+                    X: mfem.Vector,
+                    print_level: int=1,
+                    max_iter: int=500,
+                    rel_tol: float=1e-8) -> tuple[int, float]:
+    """PCG preconditioned by M, same tolerances as fea.solve_system"""
+    pcg = mfem.CGSolver()
+    pcg.SetPrintLevel(print_level)
+    pcg.SetMaxIter(max_iter)
+    pcg.SetRelTol(np.sqrt(rel_tol))
+    pcg.SetAbsTol(0.0)
+    pcg.SetOperator(A)
+    pcg.SetPreconditioner(M)
+    pcg.Mult(B, X)
+
+    return pcg.GetNumIterations(), pcg.GetFinalNorm()
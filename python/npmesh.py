@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# Copyright 2023 David Kalliecharan <dave@dal.ca>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS “AS IS”
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE
+
+"""Binary mesh and GridFunction format (*.npmesh)
+
+A *.npmesh is a directory of NumPy arrays that can be memory mapped,
+
+    meta.json           dimension, space dimension, element geometries
+    vertices.npy        (NV, sdim) float64
+    elements.npy        (NE, vertices per element) int32
+    attributes.npy      (NE,) int32
+    boundary.npy        (NBE, vertices per boundary element) int32
+    bdr_attributes.npy  (NBE,) int32
+    fields/<name>.npy   GridFunction values, float64
+    fields/<name>.json  FE collection name, vdim and ordering
+
+Values are stored at full precision, converting to and from the MFEM text
+formats with TEXT_PRECISION digits is lossless.
+"""
+
+import numpy as np
+
+# MFEM v4.5 uses deprecated numpy variable numpy.long
+major, minor, micro = [int(v) for v in np.__version__.split('.')]
+if major == 1 and micro > 23:
+    np.long = np.longlong
+
+from argparse import ArgumentParser
+import json
+import mfem.ser as mfem
+from mfem.ser import intArray
+from pathlib import Path
+from rich import print
+from typing import Union
+
+
+SUFFIX = ".npmesh"
+FORMAT_VERSION = 1
+
+# Significant digits to round trip a float64 through text
+TEXT_PRECISION = 17
+
+def is_npmesh(fname: Union[str, Path]) -> bool:
+    return Path(fname).suffix == SUFFIX
+
+
+def save_arrays(path: Union[str, Path],
+                vertices: np.ndarray,
+                elements: np.ndarray,
+                attributes: np.ndarray,
+                boundary: np.ndarray,
+                bdr_attributes: np.ndarray,
+                dim: int,
+                element_geometry: int,
+                bdr_geometry: int) -> None:
+    path = Path(path)
+    (path / "fields").mkdir(parents=True, exist_ok=True)
+
+    np.save(path / "vertices.npy", np.ascontiguousarray(vertices, dtype=np.float64))
+    np.save(path / "elements.npy", np.ascontiguousarray(elements, dtype=np.int32))
+    np.save(path / "attributes.npy", np.ascontiguousarray(attributes, dtype=np.int32))
+    np.save(path / "boundary.npy", np.ascontiguousarray(boundary, dtype=np.int32))
+    np.save(path / "bdr_attributes.npy", np.ascontiguousarray(bdr_attributes, dtype=np.int32))
+
+    meta = {
+        "version": FORMAT_VERSION,
+        "dim": int(dim),
+        "sdim": int(vertices.shape[1]),
+        "element_geometry": int(element_geometry),
+        "bdr_geometry": int(bdr_geometry),
+    }
+    with open(path / "meta.json", "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def load_arrays(path: Union[str, Path], mmap: bool=True) -> dict:
+    """Returns the meta data and mesh arrays, memory mapped by default"""
+    path = Path(path)
+    with open(path / "meta.json", "r") as f:
+        arrays = json.load(f)
+    if arrays["version"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported {SUFFIX} version {arrays['version']}")
+
+    mmap_mode = "r" if mmap else None
+    for k in ("vertices", "elements", "attributes", "boundary", "bdr_attributes"):
+        arrays[k] = np.load(path / f"{k}.npy", mmap_mode=mmap_mode)
+
+    return arrays
+
+
+def int_array(values: np.ndarray) -> mfem.intArray:
+    values = np.ascontiguousarray(values, dtype=np.int32).ravel()
+    array = intArray(len(values))
+    if len(values) > 0:
+        array.GetDataArray()[:] = values
+
+    return array
+
+
+def element_data(mesh: mfem.Mesh, boundary: bool=False) -> tuple:
+    """(geometry, connectivity, attributes) of the (boundary) elements
+
+    Mixed element meshes are not supported.
+    """
+    n = mesh.GetNBE() if boundary else mesh.GetNE()
+    if n == 0:
+        return mfem.Geometry.INVALID, np.zeros((0, 1), dtype=np.int32), \
+            np.zeros(0, dtype=np.int32)
+
+    geometry = mesh.GetBdrElementGeometry(0) if boundary else mesh.GetElementGeometry(0)
+    vertices, attributes = intArray(), intArray()
+    if boundary:
+        mesh.GetBdrElementData(geometry, vertices, attributes)
+    else:
+        mesh.GetElementData(geometry, vertices, attributes)
+    if attributes.Size() != n:
+        raise ValueError(f"Mixed element meshes are not supported by {SUFFIX}")
+    connectivity = np.array(vertices.GetDataArray(), dtype=np.int32).reshape(n, -1)
+
+    return geometry, connectivity, np.array(attributes.GetDataArray(), dtype=np.int32)
+
+
+def mesh_arrays(mesh: mfem.Mesh) -> dict:
+    """Extracts the vertices, connectivity and attributes of an MFEM mesh"""
+    element_geometry, elements, attributes = element_data(mesh)
+    bdr_geometry, boundary, bdr_attributes = element_data(mesh, boundary=True)
+
+    return {
+        "dim": mesh.Dimension(),
+        "vertices": np.array(mesh.GetVertexArray(), dtype=np.float64).reshape(mesh.GetNV(), -1),
+        "elements": elements,
+        "attributes": attributes,
+        "boundary": boundary,
+        "bdr_attributes": bdr_attributes,
+        "element_geometry": element_geometry,
+        "bdr_geometry": bdr_geometry,
+    }
+
+
+def mesh_from_arrays(arrays: dict) -> mfem.Mesh:
+    """Builds the mesh in one call from the arrays, keeps them alive as mesh.data
+
+    MFEM references the vertices in place, as (x, y, z) whatever the space
+    dimension, and copies the connectivity.
+    """
+    vertices = np.zeros((len(arrays["vertices"]), 3))
+    vertices[:, :arrays["sdim"]] = arrays["vertices"]
+    data = (mfem.Vector(vertices.ravel()),
+            int_array(arrays["elements"]), int_array(arrays["attributes"]),
+            int_array(arrays["boundary"]), int_array(arrays["bdr_attributes"]))
+    vertices, elements, attributes, boundary, bdr_attributes = data
+
+    mesh = mfem.Mesh(vertices.GetData(), len(arrays["vertices"]),
+                     elements.GetData(), arrays["element_geometry"],
+                     attributes.GetData(), attributes.Size(),
+                     boundary.GetData(), arrays["bdr_geometry"],
+                     bdr_attributes.GetData(), bdr_attributes.Size(),
+                     arrays["dim"], arrays["sdim"])
+    mesh.data = data
+
+    # Same as mfem.Mesh(meshfile, 1, 1), generate edges and fix orientation
+    mesh.Finalize(True, True)
+
+    return mesh
+
+
+def save_mesh(path: Union[str, Path], mesh: mfem.Mesh) -> None:
+    save_arrays(path, **mesh_arrays(mesh))
+
+
+def load_mesh(path: Union[str, Path]) -> mfem.Mesh:
+    return mesh_from_arrays(load_arrays(path))
+
+
+def read_mesh(fname: Union[str, Path]) -> mfem.Mesh:
+    """Loads a *.npmesh, or any mesh file MFEM can read"""
+    if is_npmesh(fname):
+        return load_mesh(fname)
+
+    # MFEM cannot handle pathlib objects
+    return mfem.Mesh(str(fname), 1, 1)
+
+
+def save_gridfunction(path: Union[str, Path],
+                      name: str,
+                      gf: mfem.GridFunction) -> None:
+    path = Path(path)
+    (path / "fields").mkdir(parents=True, exist_ok=True)
+    fes = gf.FESpace()
+    np.save(path / "fields" / f"{name}.npy", np.array(gf.GetDataArray(), copy=True))
+    meta = {
+        "fec": fes.FEColl().Name(),
+        "vdim": fes.GetVDim(),
+        "ordering": fes.GetOrdering(),
+    }
+    with open(path / "fields" / f"{name}.json", "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def load_field(path: Union[str, Path], name: str, mmap: bool=True) -> tuple:
+    """Returns the (meta data, values) of a stored GridFunction"""
+    path = Path(path)
+    with open(path / "fields" / f"{name}.json", "r") as f:
+        meta = json.load(f)
+    values = np.load(path / "fields" / f"{name}.npy",
+                     mmap_mode="r" if mmap else None)
+
+    return meta, values
+
+
+def load_gridfunction(path: Union[str, Path],
+                      name: str,
+                      mesh: mfem.Mesh) -> mfem.GridFunction:
+    """Rebuilds a GridFunction on mesh, keeps its FE space alive as gf.fes"""
+    meta, values = load_field(path, name)
+    fec = mfem.FiniteElementCollection.New(meta["fec"])
+    fes = mfem.FiniteElementSpace(mesh, fec, meta["vdim"], meta["ordering"])
+    if fes.GetVSize() != len(values):
+        raise ValueError(f"Field '{name}' does not match the FE space of the mesh")
+
+    gf = mfem.GridFunction(fes)
+    gf.Assign(np.ascontiguousarray(values))
+    gf.fec, gf.fes = fec, fes
+
+    return gf
+
+
+def fields(path: Union[str, Path]) -> list:
+    return sorted(p.stem for p in (Path(path) / "fields").glob("*.npy"))
+
+
+def to_text(path: Union[str, Path], meshfile: str) -> None:
+    """Writes the *.npmesh as meshfile and <meshfile stem>_<field>.gf"""
+    mesh = load_mesh(path)
+    mesh.Print(meshfile, TEXT_PRECISION)
+    stem = Path(meshfile).with_suffix("")
+    for name in fields(path):
+        gf = load_gridfunction(path, name, mesh)
+        gf.Save(f"{stem}_{name}.gf", TEXT_PRECISION)
+
+
+def from_text(meshfile: str,
+              path: Union[str, Path],
+              gridfunctions: Union[dict, None]=None) -> None:
+    """Converts an MFEM/gmsh mesh and {name: *.gf} GridFunctions to *.npmesh"""
+    if gridfunctions is None:
+        gridfunctions = {}
+    mesh = mfem.Mesh(meshfile, 1, 1)
+    save_mesh(path, mesh)
+    for name, gf_file in gridfunctions.items():
+        gf = mfem.GridFunction(mesh, gf_file)
+        save_gridfunction(path, name, gf)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("input", type=str,
+                        help=f"Input mesh (*.mesh, *.msh or *{SUFFIX})")
+    parser.add_argument("output", type=str,
+                        help=f"Output mesh (*{SUFFIX}, or *.mesh from *{SUFFIX})")
+    parser.add_argument("-g", "--gridfunction", type=str, nargs=2, action="append",
+                        default=[], metavar=("NAME", "GF"),
+                        help="GridFunction to store with the mesh")
+
+    args = parser.parse_args()
+
+    if is_npmesh(args.input):
+        to_text(args.input, args.output)
+    else:
+        from_text(args.input, args.output, dict(args.gridfunction))
+    print(f"Wrote {args.output}")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# Copyright 2023 David Kalliecharan <dave@dal.ca>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS “AS IS”
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE
+
+
+"""On-disk cache of the assembled, boundary condition eliminated operator
+
+The CSR arrays of the system matrix (int32 indices, float64 values) and the
+essential true dofs are stored as <key>.npz, where the key is a hash of the
+mesh file (or *.npmesh) content, the element reordering, the FE space
+(order, vdim, ordering), the Lamé parameters per attribute and the clamped
+boundary attributes. A hit skips the assembly.
+"""
+
+import numpy as np
+
+# MFEM v4.5 uses deprecated numpy variable numpy.long
+major, minor, micro = [int(v) for v in np.__version__.split('.')]
+if major == 1 and micro > 23:
+    np.long = np.longlong
+
+from hashlib import sha256
+import json
+import mfem.ser as mfem
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Union
+
+
+ROOT = Path(".").absolute().parent
+CACHE_DIR = ROOT / "cache" / "operators"
+
+FORMAT_VERSION = 1
+
+
+def sparse_matrix(indptr: np.ndarray,
+                  indices: np.ndarray,
+                  data: np.ndarray,
+                  width: int) -> mfem.SparseMatrix:
+    """Wraps CSR arrays as an mfem.SparseMatrix without copying them"""
+    indptr = np.ascontiguousarray(indptr, dtype=np.int32)
+    indices = np.ascontiguousarray(indices, dtype=np.int32)
+    data = np.ascontiguousarray(data, dtype=np.float64)
+    A = mfem.SparseMatrix([indptr, indices, data, len(indptr) - 1, width])
+    A.SetGraphOwner(False)
+    A.SetDataOwner(False)
+    # The matrix only points to the arrays
+    A._i_data, A._j_data, A._d_data = indptr, indices, data
+
+    return A
+
+
+class OperatorCache:
+    """Eliminated system matrices keyed by mesh, FE space, material and BCs"""
+    def __init__(self, cache_dir: Union[str, Path]=CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self,
+            meshfile: Union[str, Path],
+            fespace: mfem.FiniteElementSpace,
+            lame: list,
+            ess_bdr: mfem.intArray,
+            reorder: Union[str, None]=None) -> str:
+        """lame is [(lambda, mu)] per attribute, reorder as in run_analysis
+
+        The mesh content is hashed from its file, which is much cheaper than
+        walking the elements of the loaded mesh.
+        """
+        digest = sha256()
+        meshfile = Path(meshfile)
+        # A *.npmesh is hashed without its fields/
+        files = sorted(meshfile.glob("*.*")) if meshfile.is_dir() else [meshfile]
+        for path in files:
+            digest.update(path.name.encode())
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        digest.update(json.dumps({
+            "version": FORMAT_VERSION,
+            "fec": fespace.FEColl().Name(),
+            "vdim": fespace.GetVDim(),
+            "ordering": fespace.GetOrdering(),
+            "lame": [[float(l), float(m)] for l, m in lame],
+            "ess_bdr": [int(v) for v in ess_bdr.ToList()],
+            "reorder": reorder,
+        }).encode())
+
+        return digest.hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.npz"
+
+    def load(self, key: str) -> Union[tuple[mfem.SparseMatrix, mfem.intArray], None]:
+        """Returns (A, essential true dofs) or None on a miss"""
+        path = self.path(key)
+        if not path.exists():
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        with np.load(path) as f:
+            A = sparse_matrix(f["indptr"], f["indices"], f["data"], int(f["width"]))
+            ess_tdof_list = mfem.intArray(f["ess_tdofs"].tolist())
+
+        return A, ess_tdof_list
+
+    def save(self, key: str, A: mfem.SparseMatrix, ess_tdof_list: mfem.intArray) -> None:
+        path = self.path(key)
+        # Written whole to a temporary file of its own then renamed, other
+        # processes never see partial files and concurrent writers never
+        # share a temporary file
+        with NamedTemporaryFile(dir=self.cache_dir, prefix=f"{key}.",
+                                suffix=".tmp", delete=False) as f:
+            tmp = Path(f.name)
+            try:
+                np.savez(
+                    f,
+                    indptr=np.asarray(A.GetIArray(), dtype=np.int32),
+                    indices=np.asarray(A.GetJArray(), dtype=np.int32),
+                    data=A.GetDataArray(),
+                    width=A.Width(),
+                    ess_tdofs=np.array(ess_tdof_list.ToList(), dtype=np.int32),
+                )
+            except BaseException:
+                f.close()
+                tmp.unlink()
+                raise
+        tmp.replace(path)
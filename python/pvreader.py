@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# Copyright 2023 David Kalliecharan <dave@dal.ca>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS “AS IS”
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE
+
+"""Read the Paraview collections written by fea.save_paraview_frame
+
+Replaces the hand exported Paraview TSVs in the notebooks, e.g.,
+
+    from pvreader import sample_points
+    from fea import GAUGES
+    df = sample_points("../paraview/experiment/experiment.pvd", GAUGES)
+"""
+
+from argparse import ArgumentParser
+import base64
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import re
+from rich import print
+from typing import Union
+import xml.etree.ElementTree as ET
+import zlib
+
+
+VTK_DTYPES = {
+    "Int8": np.int8,
+    "UInt8": np.uint8,
+    "Int16": np.int16,
+    "UInt16": np.uint16,
+    "Int32": np.int32,
+    "UInt32": np.uint32,
+    "Int64": np.int64,
+    "UInt64": np.uint64,
+    "Float32": np.float32,
+    "Float64": np.float64,
+}
+
+# Linear and Lagrange (high order output) tetrahedra, corners come first
+VTK_TETRA = 10
+VTK_LAGRANGE_TETRAHEDRON = 71
+
+
+def decode_array(text: str, dtype: str, header_type: str="UInt32",
+                 compressed: bool=False) -> np.ndarray:
+    """Decodes an inline binary (base64) VTK DataArray
+
+    Uncompressed data is a base64 header [nbytes] followed by the base64
+    data, compressed data is a base64 header [nblocks, block size, last
+    block size, sizes...] followed by the base64 zlib blocks.
+    """
+    text = "".join(text.split())
+    header = np.dtype(VTK_DTYPES[header_type]).newbyteorder("<")
+    if not compressed:
+        header_chars = 4 * ((header.itemsize + 2) // 3)
+        nbytes = int(np.frombuffer(base64.b64decode(text[:header_chars]),
+                                   header, count=1)[0])
+        raw = base64.b64decode(text[header_chars:])
+        # View into the decoded buffer, no copy
+        return np.frombuffer(raw, VTK_DTYPES[dtype],
+                             count=nbytes // np.dtype(VTK_DTYPES[dtype]).itemsize)
+
+    # The header length is known once the number of blocks is
+    first = base64.b64decode(text[:4 * ((header.itemsize + 2) // 3)])
+    nblocks = int(np.frombuffer(first, header, count=1)[0])
+    header_bytes = (3 + nblocks) * header.itemsize
+    header_chars = 4 * ((header_bytes + 2) // 3)
+    sizes = np.frombuffer(base64.b64decode(text[:header_chars]), header,
+                          count=3 + nblocks)
+    data = base64.b64decode(text[header_chars:])
+    blocks = []
+    start = 0
+    for size in sizes[3:]:
+        blocks.append(zlib.decompress(data[start:start + int(size)]))
+        start += int(size)
+    raw = b"".join(blocks) if len(blocks) != 1 else blocks[0]
+
+    return np.frombuffer(raw, VTK_DTYPES[dtype])
+
+
+def read_vtu(vtufile: Union[str, Path]) -> dict:
+    """Points, cells, point and cell data of a *.vtu piece"""
+    root = ET.parse(vtufile).getroot()
+    compressed = root.get("compressor") is not None
+    header_type = root.get("header_type", "UInt32")
+
+    def array(node):
+        values = decode_array(node.text or "", node.get("type"), header_type,
+                              compressed)
+        ncomp = int(node.get("NumberOfComponents", 1))
+        return values.reshape(-1, ncomp) if ncomp > 1 else values
+
+    piece = root.find("UnstructuredGrid/Piece")
+    vtu = {
+        "points": array(piece.find("Points/DataArray")),
+        "point_data": {},
+        "cell_data": {},
+    }
+    for node in piece.find("Cells").findall("DataArray"):
+        vtu[node.get("Name")] = array(node)
+    for kind in ("point_data", "cell_data"):
+        data = piece.find("PointData" if kind == "point_data" else "CellData")
+        if data is None:
+            continue
+        for node in data.findall("DataArray"):
+            vtu[kind][node.get("Name")] = array(node)
+
+    return vtu
+
+
+def read_pvtu(pvtufile: Union[str, Path]) -> dict:
+    """Reads and merges the pieces of a *.pvtu"""
+    pvtufile = Path(pvtufile)
+    root = ET.parse(pvtufile).getroot()
+    pieces = [read_vtu(pvtufile.parent / p.get("Source"))
+              for p in root.iter("Piece")]
+    if len(pieces) == 1:
+        return pieces[0]
+
+    offset = np.cumsum([0] + [len(p["points"]) for p in pieces[:-1]])
+    cell_offset = np.cumsum([0] + [len(p["connectivity"]) for p in pieces[:-1]])
+    merged = {
+        "points": np.concatenate([p["points"] for p in pieces]),
+        "connectivity": np.concatenate([p["connectivity"] + o
+                                        for p, o in zip(pieces, offset)]),
+        "offsets": np.concatenate([p["offsets"] + o
+                                   for p, o in zip(pieces, cell_offset)]),
+        "types": np.concatenate([p["types"] for p in pieces]),
+        "point_data": {},
+        "cell_data": {},
+    }
+    for kind in ("point_data", "cell_data"):
+        for k in pieces[0][kind]:
+            merged[kind][k] = np.concatenate([p[kind][k] for p in pieces])
+
+    return merged
+
+
+def read_collection(pvdfile: Union[str, Path],
+                    step_size: Union[float, None]=None,
+                    vtr: Union[float, None]=None,
+                    threads: Union[int, None]=None) -> list:
+    """Returns [(cycle, time, grid)] for every Cycle* directory, in order
+
+    Each run_analysis call rewrites the *.pvd with only its own cycle (see
+    fix_pvd.py), so the cycles are found on disk. Times missing from the
+    *.pvd are cycle * step_size / vtr when given, else nan.
+    """
+    pvdfile = Path(pvdfile)
+    times = {}
+    if pvdfile.exists():
+        for ds in ET.parse(pvdfile).getroot().iter("DataSet"):
+            cycle = re.findall(r"Cycle([\d]+)", ds.get("file"))
+            if cycle:
+                times[int(cycle[0])] = float(ds.get("timestep"))
+
+    pvtufiles = sorted(pvdfile.parent.glob("Cycle*/data.pvtu"))
+    cycles = [int(re.findall(r"Cycle([\d]+)", str(p.parent.name))[0])
+              for p in pvtufiles]
+
+    # zlib and base64 decoding release the GIL
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        grids = list(pool.map(read_pvtu, pvtufiles))
+
+    collection = []
+    for cycle, grid in zip(cycles, grids):
+        if cycle in times:
+            time = times[cycle]
+        elif step_size is not None and vtr is not None:
+            time = round(cycle * step_size / vtr, 4)
+        else:
+            time = np.nan
+        collection.append((cycle, time, grid))
+
+    return collection
+
+
+def interpolate(grid: dict,
+                points: np.ndarray,
+                field: str,
+                tol: float=0.1,
+                chunk: int=16384) -> np.ndarray:
+    """Linear interpolation of a point data field at arbitrary points
+
+    The cells are tetrahedra, all points are located at once from their
+    barycentric coordinates. Points on curved surfaces can fall just outside
+    of the faceted mesh, they take the value of the nearest cell (the one of
+    largest minimum barycentric coordinate) projected into it, as long as
+    its barycentric coordinates are above -tol, i.e. within a fraction tol of
+    the cell size. Points further outside of the mesh are nan.
+    """
+    points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+    types = grid["types"]
+    if not np.all((types == VTK_TETRA) | (types == VTK_LAGRANGE_TETRAHEDRON)):
+        raise ValueError("Only tetrahedral meshes are supported")
+
+    starts = np.concatenate([[0], grid["offsets"][:-1]])
+    # Corners of each tetrahedron
+    corners = grid["connectivity"][starts[:, None] + np.arange(4)]
+    X = grid["points"][corners]                     # (ncells, 4, 3)
+    values = grid["point_data"][field]
+    V = values[corners]                             # (ncells, 4[, ncomp])
+
+    # Barycentric coordinates: T lambda = p - x_3
+    T = np.transpose(X[:, :3] - X[:, 3:4], (0, 2, 1))
+    T_inv = np.linalg.inv(T)
+    lo, hi = X.min(axis=1), X.max(axis=1)
+    pad = tol * (hi - lo).max(axis=1, keepdims=True)
+    lo, hi = lo - pad, hi + pad
+
+    shape = (len(points),) + values.shape[1:]
+    result = np.full(shape, np.nan)
+    # Minimum barycentric coordinate of the best cell of each point
+    best = np.full(len(points), -np.inf)
+    for start in range(0, len(X), chunk):
+        # Points strictly inside of a cell are done
+        todo = np.nonzero(best < 0.0)[0]
+        if len(todo) == 0:
+            break
+        cells = np.arange(start, min(start + chunk, len(X)))
+        # Bounding box prefilter of all (cell, point) pairs of the chunk
+        c, p = np.nonzero(np.all((lo[cells, None] <= points[todo])
+                                 & (points[todo] <= hi[cells, None]), axis=2))
+        if len(c) == 0:
+            continue
+        c, p = cells[c], todo[p]
+        lam = np.einsum("kij,kj->ki", T_inv[c], points[p] - X[c, 3])
+        lam = np.column_stack([lam, 1 - lam.sum(axis=1)])
+        score = lam.min(axis=1)
+        # Best cell of each point in the chunk, shared faces are continuous
+        order = np.lexsort((-score, p))
+        p, first = np.unique(p[order], return_index=True)
+        c, lam, score = c[order][first], lam[order][first], score[order][first]
+        better = (score >= -tol) & (score > best[p])
+        p, c, lam = p[better], c[better], lam[better]
+        best[p] = score[better]
+        # Project points outside of the cell on it
+        lam = np.clip(lam, 0.0, None)
+        lam /= lam.sum(axis=1, keepdims=True)
+        result[p] = np.einsum("kn,kn...->k...", lam, V[c])
+
+    return result
+
+
+def sample_points(pvdfile: Union[str, Path],
+                  points: Union[dict, np.ndarray],
+                  field: str="strain(z,z)",
+                  column: str="Strain",
+                  **kws) -> pd.DataFrame:
+    """Tidy table of field at the points (array or {name: (x, y, z)})
+
+    Columns are "Cycle", "Time (s)", "Position", "X", "Y", "Z" and column.
+    kws are passed to read_collection.
+    """
+    if isinstance(points, dict):
+        names = list(points.keys())
+        points = np.array([points[k] for k in names], dtype=np.float64)
+    else:
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        names = list(range(len(points)))
+
+    frames = []
+    for cycle, time, grid in read_collection(pvdfile, **kws):
+        values = interpolate(grid, points, field)
+        if values.ndim > 1:
+            # Vector fields are reported as their magnitude
+            values = np.linalg.norm(values, axis=1)
+        frames.append(pd.DataFrame({
+            "Cycle": cycle,
+            "Time (s)": time,
+            "Position": names,
+            "X": points[:, 0],
+            "Y": points[:, 1],
+            "Z": points[:, 2],
+            column: values,
+        }))
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def sample_line(pvdfile: Union[str, Path],
+                start: tuple[float, float, float],
+                end: tuple[float, float, float],
+                resolution: int=100,
+                **kws) -> pd.DataFrame:
+    """Samples along the line from start to end, Position is the arc length"""
+    start, end = np.asarray(start, dtype=np.float64), np.asarray(end, dtype=np.float64)
+    s = np.linspace(0, 1, resolution + 1)
+    points = start + s[:, None] * (end - start)
+    df = sample_points(pvdfile, points, **kws)
+    df["Position"] = np.tile(s * np.linalg.norm(end - start), len(df) // len(s))
+
+    return df
+
+
+if __name__ == "__main__":
+    from fea import GAUGES
+
+    parser = ArgumentParser()
+    parser.add_argument("pvdfile", type=str, help="Paraview Data Collection File")
+    parser.add_argument("-o", "--output", type=str, default=None,
+                        help="Write the gauge strains to feather")
+    parser.add_argument("-f", "--field", type=str, default="strain(z,z)",
+                        help="Point data field to sample")
+    parser.add_argument("-v", "--vtr", type=float, default=21.167,
+                        help="VTR [mm/s]")
+    parser.add_argument("-s", "--step-size", type=float, default=1,
+                        help="Step size [mm]")
+    parser.add_argument("-j", "--threads", type=int, default=None,
+                        help="Reader threads")
+
+    args = parser.parse_args()
+
+    df = sample_points(args.pvdfile, GAUGES, field=args.field,
+                       step_size=args.step_size, vtr=args.vtr,
+                       threads=args.threads)
+    print(df.pivot_table("Strain", index="Time (s)", columns="Position"))
+
+    if args.output is not None:
+        df.to_feather(args.output)
+
+    print("Finished.")
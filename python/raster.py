@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# Copyright 2023 David Kalliecharan <dave@dal.ca>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS “AS IS”
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE
+
+
+"""2D raster scan of the PWJ over the sample face
+
+Instead of meshing and solving once per (x, y), the post and sample are
+meshed once. A gauge strain is a linear functional l of the solution, so
+
+    strain(x, y) = l^T K^-1 b(x, y) = (K^-1 l)^T b(x, y)
+
+and one adjoint solve per gauge gives its response to the PWJ anywhere on
+the sample face. The footprint integrals of b(x, y) are evaluated for all
+grid points at once from the quadrature points of the face; the footprint
+edge is resolved by the quadrature order, not by the mesh.
+"""
+
+import numpy as np
+
+# MFEM v4.5 uses deprecated numpy variable numpy.long
+major, minor, micro = [int(v) for v in np.__version__.split('.')]
+if major == 1 and micro > 23:
+    np.long = np.longlong
+
+from argparse import ArgumentParser
+from experiment import SAMPLE_BOUNDARY, mesh_step, sweep_positions
+from fea import (
+    Z_HAT,
+    essential_dofs,
+    lame_coefficients,
+    lame_parameters,
+    clamped_boundary,
+    locate_gauges,
+    solve_system,
+)
+import mfem.ser as mfem
+from npmesh import read_mesh
+from opcache import CACHE_DIR, OperatorCache
+import pandas as pd
+from pathlib import Path
+from rich import print
+from telemetry import Telemetry
+from typing import Union
+
+
+ROOT = Path(".").absolute().parent
+
+# Boundary attribute of the PWJ footprint, its plane is the sample face
+PWJ_BOUNDARY = 2
+
+
+def raster_positions(radius: float,
+                     step_size: float,
+                     no_overlap: bool=False) -> np.ndarray:
+    """PWJ (x, y) centers (mm) on a square grid over the sample face
+
+    Same limits as experiment.sweep_positions, in the radial direction.
+    """
+    axis = sweep_positions(radius, step_size, no_overlap)
+    x, y = np.meshgrid(axis, axis, indexing="ij")
+    xy = np.column_stack([x.ravel(), y.ravel()])
+    r = np.hypot(xy[:, 0], xy[:, 1])
+    if no_overlap:
+        inside = r <= SAMPLE_BOUNDARY - radius + 1e-9
+    else:
+        inside = r < SAMPLE_BOUNDARY + radius
+
+    return xy[inside]
+
+
+def gauge_functionals(mesh: mfem.Mesh,
+                      fespace: mfem.FiniteElementSpace,
+                      located: dict,
+                      si: int=Z_HAT,
+                      sj: int=Z_HAT) -> dict:
+    """Returns {name: l}, where strain(si, sj) at the gauge is l^T u
+
+    Same strain as fea.gauge_strain, as a vector over the dofs of fespace.
+    """
+    dim = mesh.Dimension()
+    functionals = {}
+    for k, (elem_id, ip) in located.items():
+        T = mesh.GetElementTransformation(elem_id)
+        T.SetIntPoint(ip)
+        fe = fespace.GetFE(elem_id)
+        nd = fe.GetDof()
+        dshape = mfem.DenseMatrix(nd, dim)
+        fe.CalcPhysDShape(T, dshape)
+        # Element vdofs are grouped by component for either ordering
+        vdofs = np.asarray(fespace.GetElementVDofs(elem_id)).reshape(-1, nd)
+        l = np.zeros(fespace.GetVSize())
+        dphi = dshape.GetDataArray()
+        np.add.at(l, vdofs[si], 0.5 * dphi[:, sj])
+        np.add.at(l, vdofs[sj], 0.5 * dphi[:, si])
+        functionals[k] = l
+
+    return functionals
+
+
+def face_quadrature(mesh: mfem.Mesh,
+                    fespace: mfem.FiniteElementSpace,
+                    order: int=8,
+                    tol: float=1e-6) -> tuple:
+    """Quadrature of the traction in z over the sample face
+
+    The face is every boundary element in the plane of the PWJ footprint.
+    Returns the (nqp, 2) in-plane points and the sparse (rows, dofs, values)
+    with the z traction integral of the dof from a unit load at each point.
+    """
+    dim = mesh.Dimension()
+    vertices = np.array(mesh.GetVertexArray())
+    bdr_attributes = mesh.GetBdrAttributeArray()
+    plane = max(vertices[mesh.GetBdrElementVertices(i), dim - 1].max()
+                for i in np.nonzero(bdr_attributes == PWJ_BOUNDARY)[0])
+
+    points, rows, dofs, values = [], [], [], []
+    for i in range(mesh.GetNBE()):
+        if np.any(np.abs(vertices[mesh.GetBdrElementVertices(i), dim - 1] - plane) > tol):
+            continue
+        fe = fespace.GetBE(i)
+        nd = fe.GetDof()
+        vdofs = np.asarray(fespace.GetBdrElementVDofs(i)).reshape(-1, nd)[dim - 1]
+        T = mesh.GetBdrElementTransformation(i)
+        ir = mfem.IntRules.Get(mesh.GetBdrElementGeometry(i), order)
+        shape = mfem.Vector(nd)
+        for j in range(ir.GetNPoints()):
+            ip = ir.IntPoint(j)
+            T.SetIntPoint(ip)
+            X = T.Transform(ip)
+            fe.CalcShape(ip, shape)
+            rows.append(np.full(nd, len(points)))
+            dofs.append(vdofs)
+            values.append(ip.weight * T.Weight() * shape.GetDataArray())
+            points.append((X[0], X[1]))
+
+    return (np.array(points), np.concatenate(rows), np.concatenate(dofs),
+            np.concatenate(values))
+
+
+def footprint_response(points: np.ndarray,
+                       weights: np.ndarray,
+                       centers: np.ndarray,
+                       radius: float,
+                       chunk: int=256) -> np.ndarray:
+    """sum_q weights[q, g] over the points within radius of each center
+
+    Returns (ncenters, ngauges), every center is evaluated at once per chunk.
+    """
+    response = np.empty((len(centers), weights.shape[1]))
+    for start in range(0, len(centers), chunk):
+        c = centers[start:start + chunk]
+        d2 = ((points[:, None, :] - c[None, :, :])**2).sum(axis=2)
+        response[start:start + chunk] = (d2 <= radius**2).T.astype(np.float64) @ weights
+
+    return response
+
+
+def raster_scan(meshfile: str,
+                pwj_force: float,
+                centers: np.ndarray,
+                radius: float,
+                material_0: str="Al 6061-T6",
+                material_1: str="Ti6Al4V-G23",
+                quadrature_order: int=8,
+                telemetry: Union[Telemetry, None]=None,
+                operator_cache: Union[OperatorCache, None]=None,
+                quiet: bool=False) -> pd.DataFrame:
+    """Gauge strain(z,z) for the PWJ at each (x, y) center on one mesh
+
+    Returns a tidy table with the columns "X", "Y", "Position" and "Strain".
+    """
+    if telemetry is None:
+        telemetry = Telemetry()
+
+    with telemetry.phase("mesh_load"):
+        mesh = read_mesh(meshfile)
+    dim = mesh.Dimension()
+
+    with telemetry.phase("assembly"):
+        fec = mfem.H1_FECollection(1, dim)
+        fespace = mfem.FiniteElementSpace(mesh, fec, dim)
+        ess_tdof_list = essential_dofs(mesh, fespace)
+        lamb_coef, mu_coef = lame_coefficients(mesh, material_0, material_1,
+                                               verbose=not quiet)
+
+        cached = None
+        if operator_cache is not None:
+            key = operator_cache.key(meshfile, fespace,
+                                     lame_parameters(mesh, material_0, material_1),
+                                     clamped_boundary(mesh))
+            cached = operator_cache.load(key)
+            telemetry.set(operator_cache="miss" if cached is None else "hit")
+        if cached is not None:
+            A, ess_tdof_list = cached
+        else:
+            a = mfem.BilinearForm(fespace)
+            a.AddDomainIntegrator(mfem.ElasticityIntegrator(lamb_coef, mu_coef))
+            a.Assemble()
+            Aptr = mfem.OperatorPtr()
+            a.FormSystemMatrix(ess_tdof_list, Aptr)
+            A = mfem.OperatorHandle2SparseMatrix(Aptr)
+            if operator_cache is not None:
+                operator_cache.save(key, A, ess_tdof_list)
+
+    # One adjoint solve per gauge, K is symmetric
+    with telemetry.phase("solve"):
+        located = locate_gauges(mesh, strict=False)
+        if not located:
+            raise ValueError("No gauges are inside of the mesh")
+        functionals = gauge_functionals(mesh, fespace, located)
+        ess = np.array(ess_tdof_list.ToList(), dtype=int)
+        adjoints = {}
+        iterations = 0
+        for k, l in functionals.items():
+            l[ess] = 0.0
+            B = mfem.Vector(l)
+            X = mfem.Vector(len(l))
+            X.Assign(0.0)
+            its, _ = solve_system(A, B, X, print_level=0 if quiet else 1,
+                                  max_iter=2000, rel_tol=1e-16)
+            iterations += its
+            adjoints[k] = X.GetDataArray().copy()
+            # The eliminated load is zero on the clamped dofs
+            adjoints[k][ess] = 0.0
+
+    with telemetry.phase("footprint"):
+        points, rows, dofs, values = face_quadrature(mesh, fespace, quadrature_order)
+        names = list(adjoints.keys())
+        weights = np.zeros((len(points), len(names)))
+        for g, k in enumerate(names):
+            np.add.at(weights[:, g], rows, values * adjoints[k][dofs])
+        strain = pwj_force * footprint_response(points, weights, centers, radius)
+
+    telemetry.set(elements=mesh.GetNE(), dofs=fespace.GetTrueVSize(),
+                  iterations=iterations, grid_points=len(centers),
+                  quadrature_points=len(points))
+
+    return pd.DataFrame({
+        "X": np.repeat(centers[:, 0], len(names)),
+        "Y": np.repeat(centers[:, 1], len(names)),
+        "Position": np.tile(names, len(centers)),
+        "Strain": strain.ravel(),
+    })
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("geofile", type=str, nargs="?",
+                        default=str(ROOT / "gmsh/system.geo"),
+                        help="Input geo file, meshed with the PWJ at the center")
+    parser.add_argument("--mesh", type=str, default=None,
+                        help="Use this mesh instead of meshing the geo file")
+    parser.add_argument("-m", "--sample-material", type=str, default="Ti6Al4V-G23",
+                        help="Sample material defined in {YOUNG,SHEAR}_MOD")
+    parser.add_argument("-p", "--pressure", type=float, default=-31.03E6,
+                        help="Applied pressure in Pa")
+    parser.add_argument("-R", "--radius", type=float, default=2.5,
+                        help="Radius of PWJ")
+    parser.add_argument("--step-size", type=float, default=1,
+                        help="Grid spacing [mm]")
+    parser.add_argument("--no-overlap", action="store_true", default=False,
+                        help="Keep the PWJ fully on the sample")
+    parser.add_argument("-s", "--size", type=float, default=0.1,
+                        help="Mesh Size Factor (dflt: 0.1)")
+    parser.add_argument("--quadrature-order", type=int, default=8,
+                        help="Quadrature order of the footprint integrals")
+    parser.add_argument("-o", "--output", type=str, default="../data/raster.feather",
+                        help="Gauge strain map (feather)")
+    parser.add_argument("--operator-cache", type=str, nargs="?", default=None,
+                        const=str(CACHE_DIR), metavar="DIR",
+                        help=f"Reuse assembled operators (dflt: {CACHE_DIR})")
+    parser.add_argument("-t", "--telemetry", type=str, default=None,
+                        help="Write per phase timings to a JSON lines file")
+    parser.add_argument("-q", "--quiet", action="store_true", default=False,
+                        help="Suppress console output")
+
+    args = parser.parse_args()
+
+    telemetry = Telemetry(args.telemetry)
+    meshfile = args.mesh
+    if meshfile is None:
+        meshfile, _, phases = mesh_step(args.geofile, 0.0, args.radius, args.size,
+                                        "raster", quiet=args.quiet)
+        for k, v in phases.items():
+            telemetry.add(k, v)
+
+    centers = raster_positions(args.radius, args.step_size, args.no_overlap)
+    df = raster_scan(
+        meshfile,
+        args.pressure,
+        centers,
+        args.radius,
+        material_1=args.sample_material,
+        quadrature_order=args.quadrature_order,
+        telemetry=telemetry,
+        operator_cache=None if args.operator_cache is None
+                       else OperatorCache(args.operator_cache),
+        quiet=args.quiet,
+    )
+    record = telemetry.write(mesh=meshfile)
+    print(f"{len(centers)} grid points | {record['total']:0.2f} s"
+          + f" | {record['iterations']} adjoint iterations")
+    print(df.groupby("Position")["Strain"].agg(["min", "max"]))
+
+    df.to_feather(args.output)
+
+    print("Finished.")
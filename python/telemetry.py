@@ -0,0 +1,101 @@
+# coding: utf-8
+# Copyright 2023 David Kalliecharan <dave@dal.ca>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS “AS IS”
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE
+
+from contextlib import contextmanager
+import json
+import resource
+from time import perf_counter, time
+from typing import Union
+
+
+PHASES = [
+    "geo_update",
+    "meshing",
+    "mesh_load",
+    "reorder",
+    "assembly",
+    "solve",
+    "footprint",
+    "projection",
+    "output",
+]
+
+
+class Telemetry:
+    """Per-phase timers and solver statistics written as JSON lines
+
+    A record accumulates phase wall times and fields (DOFs, iterations, ...)
+    until write() appends it to the log file as one JSON line and starts a
+    new record. Without a log file the records are only kept in memory.
+    """
+    def __init__(self, logfile: Union[str, None]=None):
+        self.logfile = logfile
+        self.phases = {}
+        self.fields = {}
+        self.records = []
+        if self.logfile is not None:
+            # Truncate, a sweep writes a fresh log
+            open(self.logfile, "w").close()
+
+    @contextmanager
+    def phase(self, name: str):
+        t0 = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter() - t0)
+
+    def add(self, name: str, seconds: float):
+        """Adds a phase timed elsewhere, e.g., in another process"""
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def set(self, **kws):
+        self.fields.update(kws)
+
+    def write(self, **kws) -> dict:
+        record = {
+            "timestamp": time(),
+            **kws,
+            **self.fields,
+            "phases": self.phases,
+            "total": sum(self.phases.values()),
+            # Linux reports kB
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+        self.records.append(record)
+        if self.logfile is not None:
+            with open(self.logfile, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+        self.phases = {}
+        self.fields = {}
+
+        return record
+
+
+def read_telemetry(logfile: str) -> list:
+    """Reads the JSON lines written by Telemetry"""
+    with open(logfile, "r") as f:
+        return [json.loads(l) for l in f if l.strip()]
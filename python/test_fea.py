@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# Copyright 2023 David Kalliecharan <dave@dal.ca>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS “AS IS”
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE
+
+
+"""Gauge location of fea, run with pytest"""
+
+import numpy as np
+
+# MFEM v4.5 uses deprecated numpy variable numpy.long
+major, minor, micro = [int(v) for v in np.__version__.split('.')]
+if major == 1 and micro > 23:
+    np.long = np.longlong
+
+import fea
+import mfem.ser as mfem
+import pytest
+
+
+@pytest.fixture
+def box(tmp_path, monkeypatch):
+    """Post and sample box, slightly off centre in x with the gauges on x = 5
+
+    The rotated gauges fall just outside of the face x = -4.99, as the mirror
+    gauges of the faceted post do.
+    """
+    mesh = mfem.Mesh.MakeCartesian3D(4, 4, 14, mfem.Element.TETRAHEDRON,
+                                     9.99, 10.0, 70.0)
+    shift = mfem.Vector([-4.99] * mesh.GetNV() + [-5.0] * mesh.GetNV()
+                        + [0.0] * mesh.GetNV())
+    mesh.MoveVertices(shift)
+    vertices = np.array(mesh.GetVertexArray())
+    for e in range(mesh.GetNE()):
+        z = vertices[mesh.GetElementVertices(e), 2].mean()
+        mesh.SetAttribute(e, 1 if z < 55.0 else 2)
+    for b in range(mesh.GetNBE()):
+        z = vertices[mesh.GetBdrElementVertices(b), 2]
+        mesh.SetBdrAttribute(b, 1 if z.max() < 1e-9 else 2 if z.min() > 70.0 - 1e-9 else 3)
+    mesh.SetAttributes()
+    fname = str(tmp_path / "box.mesh")
+    mesh.Print(fname)
+    # locate_gauges holds GAUGES as a default, patch the items in place
+    for k, (_, _, z) in list(fea.GAUGES.items()):
+        monkeypatch.setitem(fea.GAUGES, k, (5.0, 0.0, z))
+
+    return fname
+
+
+def test_mirror_gauges(box, tmp_path):
+    results = fea.run_analysis(box, -31.03E6, 0.0, quiet=True, mirror=(1, 1.0),
+                               prefix=str(tmp_path))
+    assert results["strain"].keys() == fea.GAUGES.keys()
+    assert results["strain_mirror"].keys() == fea.GAUGES.keys()
+
+
+def test_gauge_outside(box):
+    mesh = mfem.Mesh(box)
+    located = fea.locate_gauges(mesh, {"near": (-5.0, 0.0, 40.0)})
+    assert "near" in located
+    with pytest.raises(ValueError):
+        fea.locate_gauges(mesh, {"far": (-8.0, 0.0, 40.0)})
+    assert fea.locate_gauges(mesh, {"far": (-8.0, 0.0, 40.0)}, strict=False) == {}
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# Copyright 2023 David Kalliecharan <dave@dal.ca>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS “AS IS”
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE
+
+
+"""Sign convention and fits of fit_calibration, run with pytest"""
+
+import numpy as np
+
+# MFEM v4.5 uses deprecated numpy variable numpy.long
+major, minor, micro = [int(v) for v in np.__version__.split('.')]
+if major == 1 and micro > 23:
+    np.long = np.longlong
+
+from fea import SHEAR_MOD, YOUNG_MOD, lambda_shear
+from fit_calibration import SENSOR_SIGN, fit, measured_strain, scaled_lame
+import pandas as pd
+import pytest
+
+
+# Gauge strain per Pa, as from unit_responses
+RESPONSES = pd.DataFrame({"scale": [1.0], "bot": [-3.1e-11], "mid": [-3.2e-11],
+                          "top": [-3.3e-11], "mean": [-3.2e-11]}).set_index("scale")
+
+GAIN = 3.3 / 2.0e-3
+
+
+def readings(k: float) -> pd.DataFrame:
+    """Sensor voltages of the gauge circuit for a pressure scale k"""
+    P = np.repeat([-10e6, -20e6, -30e6], 3)
+    positions = ["bot", "mid", "top"] * 3
+    strain = k * P * RESPONSES.loc[1.0, positions].values
+    return pd.DataFrame({"Pressure (Pa)": P, "Position": positions,
+                         "Voltage (V)": GAIN * SENSOR_SIGN * strain})
+
+
+def test_sensor_sign():
+    df = readings(0.9)
+    strain = measured_strain(df, GAIN)
+    # The circuit reads the opposite sign of the simulated strain(z,z)
+    assert np.all(np.sign(strain) == -np.sign(df["Voltage (V)"]))
+
+    df["Sensor Strain"] = df["Voltage (V)"] / GAIN
+    np.testing.assert_allclose(measured_strain(df.drop(columns="Voltage (V)")),
+                               strain)
+    with pytest.raises(ValueError):
+        measured_strain(df.drop(columns=["Sensor Strain"]))
+
+
+def test_fit_pressure_from_voltage():
+    df = readings(0.9)
+    df["Strain"] = measured_strain(df, GAIN)
+    k, dk = fit(df, RESPONSES, "pressure")["pressure_scale"]
+
+    assert k == pytest.approx(0.9)
+    assert dk == pytest.approx(0.0, abs=1e-9)
+
+
+def test_scaled_lame():
+    young, shear = dict(YOUNG_MOD), dict(SHEAR_MOD)
+    lame = scaled_lame("Ti6Al4V-G23", 1.15)
+
+    # The material tables are left alone
+    assert YOUNG_MOD == young and SHEAR_MOD == shear
+    E, G = YOUNG_MOD["Ti6Al4V-G23"], SHEAR_MOD["Ti6Al4V-G23"]
+    np.testing.assert_allclose(lame[1], (1.15 * lambda_shear(E, G), 1.15 * G))
+    E, G = YOUNG_MOD["Al 6061-T6"], SHEAR_MOD["Al 6061-T6"]
+    np.testing.assert_allclose(lame[0], (lambda_shear(E, G), G))
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# Copyright 2023 David Kalliecharan <dave@dal.ca>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS “AS IS”
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE
+
+
+"""Round trips MFEM Paraview collections through pvreader, run with pytest"""
+
+import numpy as np
+
+# MFEM v4.5 uses deprecated numpy variable numpy.long
+major, minor, micro = [int(v) for v in np.__version__.split('.')]
+if major == 1 and micro > 23:
+    np.long = np.longlong
+
+import mfem.ser as mfem
+import pytest
+from pvreader import read_collection, sample_points
+
+
+def linear(x):
+    return 1.0 + x[0] + 2.0 * x[1] + 3.0 * x[2]
+
+
+def save_collection(path, compression: bool):
+    """Linear field on a unit cube, saved like fea.save_paraview_frame"""
+    mesh = mfem.Mesh.MakeCartesian3D(3, 3, 3, mfem.Element.TETRAHEDRON,
+                                     1.0, 1.0, 1.0)
+    fec = mfem.H1_FECollection(1, 3)
+    fespace = mfem.FiniteElementSpace(mesh, fec)
+    gf = mfem.GridFunction(fespace)
+    # Order 1 dofs are the vertices
+    gf.Assign(np.array([linear(x) for x in mesh.GetVertexArray()]))
+
+    pdc = mfem.ParaViewDataCollection("unit", mesh)
+    pdc.SetPrefixPath(str(path))
+    pdc.SetLevelsOfDetail(1)
+    pdc.SetDataFormat(mfem.VTKFormat_BINARY)
+    pdc.SetHighOrderOutput(True)
+    pdc.SetCompression(compression)
+    pdc.RegisterField("field", gf)
+    for cycle in range(2):
+        pdc.SetCycle(cycle)
+        pdc.SetTime(0.5 * cycle)
+        pdc.Save()
+
+    return path / "unit" / "unit.pvd"
+
+
+@pytest.mark.parametrize("compression", [False, True])
+def test_read_collection(tmp_path, compression):
+    pvdfile = save_collection(tmp_path, compression)
+    collection = read_collection(pvdfile)
+
+    assert [cycle for cycle, _, _ in collection] == [0, 1]
+    grid = collection[0][2]
+    # High order output has the points of every cell
+    assert len(grid["types"]) == 6 * 27
+    assert grid["points"].shape == (4 * 6 * 27, 3)
+    np.testing.assert_allclose(grid["point_data"]["field"],
+                               [linear(x) for x in grid["points"]])
+
+
+@pytest.mark.parametrize("compression", [False, True])
+def test_sample_points(tmp_path, compression):
+    pvdfile = save_collection(tmp_path, compression)
+    points = {"a": (0.1, 0.2, 0.3), "b": (0.55, 0.45, 0.95), "out": (2.0, 0, 0),
+              "surface": (1.0 + 1e-3, 0.5, 0.5)}
+    df = sample_points(pvdfile, points, field="field")
+
+    assert len(df) == 2 * len(points)
+    for k, x in points.items():
+        values = df.loc[df["Position"] == k, "Strain"].values
+        if k == "out":
+            assert np.all(np.isnan(values))
+        elif k == "surface":
+            # Just outside of the faceted surface, pulled into the nearest cell
+            np.testing.assert_allclose(values, linear((1.0, 0.5, 0.5)), atol=1e-2)
+        else:
+            np.testing.assert_allclose(values, linear(x))
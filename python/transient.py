@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# coding: utf-8
+# Copyright 2023 David Kalliecharan <dave@dal.ca>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS “AS IS”
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT
+# OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH
+# DAMAGE
+
+import numpy as np
+
+# MFEM v4.5 uses deprecated numpy variable numpy.long
+major, minor, micro = [int(v) for v in np.__version__.split('.')]
+if major == 1 and micro > 23:
+    np.long = np.longlong
+
+from argparse import ArgumentParser
+from fea import (
+    DENSITY,
+    essential_dofs,
+    gauge_strain,
+    lame_coefficients,
+    locate_gauges,
+    pwj_load,
+    save_paraview_frame,
+)
+from elasticity import (
+        StrainCoefficient,
+)
+import mfem.ser as mfem
+import pandas as pd
+from rich import print
+
+
+SCHEMES = ("newmark", "generalized-alpha")
+
+
+def pulse_train(t: float,
+                frequency: float,
+                duty: float=0.5,
+                rise: float=0.1) -> float:
+    """Normalized trapezoidal pulse train at time t
+
+    duty is the fraction of the period the jet is on, and rise is the
+    fraction of the on-time spent ramping up (and down again).
+    """
+    period = 1 / frequency
+    t_on = duty * period
+    t_ramp = rise * t_on
+    tau = t % period
+    if tau >= t_on:
+        return 0.0
+    if t_ramp > 0 and tau < t_ramp:
+        return tau / t_ramp
+    if t_ramp > 0 and tau > t_on - t_ramp:
+        return (t_on - tau) / t_ramp
+
+    return 1.0
+
+
+def integration_parameters(scheme: str, rho_inf: float=1.0) -> tuple:
+    """Returns (alpha_m, alpha_f, beta, gamma) for the time integrator
+
+    Newmark is the average acceleration method, generalized-alpha follows
+    Chung & Hulbert with spectral radius rho_inf at infinite frequency.
+    """
+    if scheme == "newmark":
+        return 0.0, 0.0, 0.25, 0.5
+    if scheme == "generalized-alpha":
+        if not 0.0 <= rho_inf <= 1.0:
+            raise ValueError("'rho_inf' must be within [0, 1]")
+        alpha_m = (2 * rho_inf - 1) / (rho_inf + 1)
+        alpha_f = rho_inf / (rho_inf + 1)
+        gamma = 0.5 - alpha_m + alpha_f
+        beta = 0.25 * (1 - alpha_m + alpha_f)**2
+        return alpha_m, alpha_f, beta, gamma
+
+    raise ValueError(f"Unknown scheme '{scheme}', use one of {SCHEMES}")
+
+
+def density_coefficient(mesh: mfem.Mesh,
+                        material_0: str,
+                        material_1: str,
+                        length_scale: float=1E-3) -> mfem.PWConstCoefficient:
+    """Piece-wise constant density consistent with the mesh length units
+
+    With stresses in Pa and lengths in units of length_scale [m], the
+    momentum balance needs rho * length_scale^2, e.g., 1E-6 for mm meshes.
+    """
+    rho = mfem.Vector(mesh.attributes.Max())
+    rho.Assign(1.0)
+    rho[0] *= DENSITY[material_0]
+    if rho.Size() > 1:
+        rho[1] *= DENSITY[material_1]
+    rho *= length_scale**2
+
+    return mfem.PWConstCoefficient(rho)
+
+
+def run_transient(fname: str,
+                  pwj_force: float,
+                  frequency: float,
+                  pulses: int=5,
+                  duty: float=0.5,
+                  rise: float=0.1,
+                  samples_per_pulse: int=40,
+                  scheme: str="newmark",
+                  rho_inf: float=1.0,
+                  damping: tuple[float, float]=(0.0, 0.0),
+                  material_0: str="Al 6061-T6",
+                  material_1: str="Ti6Al4V-G23",
+                  length_scale: float=1E-3,
+                  dataname: str="transient",
+                  frame_every: int=0) -> pd.DataFrame:
+    """Elastodynamic response of the post to a pulsed PWJ load
+
+    The effective operator is assembled and preconditioned once for the fixed
+    time step, each step only updates the right hand side and solves for the
+    new acceleration. damping is the Rayleigh (mass, stiffness) pair.
+    Returns the gauge strain time histories at pulse resolution.
+    """
+    order = 1
+    meshfile = fname
+    print(meshfile)
+
+    mesh = mfem.Mesh(meshfile, 1, 1)
+    dim = mesh.Dimension()
+
+    fec = mfem.H1_FECollection(order, dim)
+    fespace = mfem.FiniteElementSpace(mesh, fec, dim)
+    print("Number of finite element unknowns: " + str(fespace.GetTrueVSize()))
+
+    ess_tdof_list = essential_dofs(mesh, fespace)
+
+    # By linearity the load is the unit pulse shape times the assembled PWJ load
+    b = pwj_load(mesh, fespace, pwj_force)
+
+    lamb_coef, mu_coef = lame_coefficients(mesh, material_0, material_1)
+    rho_coef = density_coefficient(mesh, material_0, material_1, length_scale)
+
+    k = mfem.BilinearForm(fespace)
+    k.AddDomainIntegrator(mfem.ElasticityIntegrator(lamb_coef, mu_coef))
+    k.Assemble()
+    K = mfem.SparseMatrix()
+    k.FormSystemMatrix(ess_tdof_list, K)
+
+    m = mfem.BilinearForm(fespace)
+    m.AddDomainIntegrator(mfem.VectorMassIntegrator(rho_coef))
+    m.Assemble()
+    M = mfem.SparseMatrix()
+    m.FormSystemMatrix(ess_tdof_list, M)
+
+    # Rayleigh damping C = a_M * M + a_K * K
+    a_M, a_K = damping
+    damped = a_M != 0.0 or a_K != 0.0
+    if damped:
+        C = mfem.Add(a_M, M, a_K, K)
+
+    alpha_m, alpha_f, beta, gamma = integration_parameters(scheme, rho_inf)
+    dt = 1 / (frequency * samples_per_pulse)
+    steps = pulses * samples_per_pulse
+    print(f"Scheme: {scheme} | dt : {dt:0.3g} s | steps : {steps}")
+
+    # Effective operator for the acceleration at t_{n+1}
+    #   S = (1 - a_m) M + (1 - a_f) gamma dt C + (1 - a_f) beta dt^2 K
+    S = mfem.Add(1 - alpha_m, M, (1 - alpha_f) * beta * dt**2, K)
+    if damped:
+        S = mfem.Add(1.0, S, (1 - alpha_f) * gamma * dt, C)
+
+    if hasattr(mfem, "UMFPackSolver"):
+        print("Factorizing effective operator (UMFPack)")
+        solver = mfem.UMFPackSolver()
+        solver.SetOperator(S)
+    else:
+        print("Preconditioning effective operator (GSSmoother)")
+        P = mfem.GSSmoother(S)
+        solver = mfem.CGSolver()
+        solver.SetRelTol(1e-10)
+        solver.SetAbsTol(0.0)
+        solver.SetMaxIter(500)
+        solver.SetPrintLevel(0)
+        solver.SetPreconditioner(P)
+        solver.SetOperator(S)
+        # Warm start from the previous acceleration
+        solver.iterative_mode = True
+
+    size = fespace.GetTrueVSize()
+    u = mfem.Vector(size)
+    v = mfem.Vector(size)
+    a = mfem.Vector(size)
+    u_pred = mfem.Vector(size)
+    v_pred = mfem.Vector(size)
+    rhs = mfem.Vector(size)
+    tmp = mfem.Vector(size)
+    for vec in (u, v, a):
+        vec.Assign(0.0)
+
+    # Initial acceleration from M a_0 = F(0), the body starts at rest
+    F = b
+    load_0 = pulse_train(0.0, frequency, duty, rise)
+    if load_0 != 0.0:
+        rhs.Assign(F)
+        rhs *= load_0
+        rhs.SetSubVector(ess_tdof_list, 0.0)
+        M_prec = mfem.DSmoother(M)
+        mfem.PCG(M, M_prec, rhs, a, 0, 500, 1e-20, 0.0)
+
+    x = mfem.GridFunction(fespace)
+    located = locate_gauges(mesh)
+
+    if frame_every > 0:
+        scalar_space = mfem.FiniteElementSpace(mesh, fec)
+        strain = mfem.GridFunction(scalar_space)
+        strain_coef = StrainCoefficient()
+        strain_coef.SetDisplacement(x)
+        strain_coef.SetComponent(2, 2)
+
+    records = []
+    def record(step: int, t: float, load: float):
+        x.SetFromTrueDofs(u)
+        for position, value in gauge_strain(mesh, x, located).items():
+            records.append((t, step, load, position, value))
+
+    record(0, 0.0, load_0)
+    for n in range(steps):
+        t = (n + 1) * dt
+        t_alpha = t - alpha_f * dt
+        load = pulse_train(t, frequency, duty, rise)
+
+        # Predictors
+        #   u_pred = u_n + dt v_n + dt^2 (1/2 - beta) a_n
+        #   v_pred = v_n + dt (1 - gamma) a_n
+        u_pred.Assign(u)
+        u_pred.Add(dt, v)
+        u_pred.Add(dt**2 * (0.5 - beta), a)
+        v_pred.Assign(v)
+        v_pred.Add(dt * (1 - gamma), a)
+
+        # rhs = F(t_{n+1-a_f}) - a_m M a_n
+        #       - K ((1 - a_f) u_pred + a_f u_n)
+        #       - C ((1 - a_f) v_pred + a_f v_n)
+        rhs.Assign(F)
+        rhs *= pulse_train(t_alpha, frequency, duty, rise)
+        if alpha_m != 0.0:
+            M.AddMult(a, rhs, -alpha_m)
+        tmp.Assign(u_pred)
+        tmp *= 1 - alpha_f
+        tmp.Add(alpha_f, u)
+        K.AddMult(tmp, rhs, -1.0)
+        if damped:
+            tmp.Assign(v_pred)
+            tmp *= 1 - alpha_f
+            tmp.Add(alpha_f, v)
+            C.AddMult(tmp, rhs, -1.0)
+        rhs.SetSubVector(ess_tdof_list, 0.0)
+
+        solver.Mult(rhs, a)
+
+        # Correctors
+        u.Assign(u_pred)
+        u.Add(beta * dt**2, a)
+        v.Assign(v_pred)
+        v.Add(gamma * dt, a)
+
+        record(n + 1, t, load)
+
+        if frame_every > 0 and (n + 1) % frame_every == 0:
+            strain.ProjectCoefficient(strain_coef)
+            save_paraview_frame(dataname, 0.0, mesh, x, strain,
+                                cycle=n + 1, time=t)
+
+    df = pd.DataFrame.from_records(
+        records,
+        columns=["Time (s)", "Step", "Load", "Position", "Strain"],
+    )
+
+    return df
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+
+    parser.add_argument("mesh", type=str, help="Input Mesh file")
+    parser.add_argument("-m", "--sample-material", type=str, default="Ti6Al4V-G23",
+                        help="Sample material defined in {YOUNG,SHEAR}_MOD")
+    parser.add_argument("-p", "--pressure", type=float, default=-31.03E6,
+                        help="Peak applied pressure in Pa")
+    parser.add_argument("-o", "--output", type=str, default="../data/transient.feather",
+                        help="Gauge time history output (feather)")
+    parser.add_argument("-n", "--name", type=str, default="transient",
+                        help="Paraview output name")
+    parser.add_argument("--frame-every", type=int, default=0,
+                        help="Write a Paraview frame every N steps (0: never)")
+    parser.add_argument("--length-scale", type=float, default=1E-3,
+                        help="Mesh length unit in m (dflt: mm)")
+
+    group = parser.add_argument_group("Pulse train")
+    group.add_argument("-f", "--frequency", type=float, default=20E3,
+                       help="Pulse frequency in Hz")
+    group.add_argument("--pulses", type=int, default=5,
+                       help="Number of pulses to simulate")
+    group.add_argument("--duty", type=float, default=0.5,
+                       help="Fraction of the period the jet is on")
+    group.add_argument("--rise", type=float, default=0.1,
+                       help="Fraction of the on-time to ramp up/down")
+    group.add_argument("--samples-per-pulse", type=int, default=40,
+                       help="Time steps per pulse period")
+
+    group = parser.add_argument_group("Time integration")
+    group.add_argument("--scheme", type=str, default="newmark", choices=SCHEMES,
+                       help="Time integration scheme")
+    group.add_argument("--rho-inf", type=float, default=0.8,
+                       help="Generalized-alpha spectral radius")
+    group.add_argument("--rayleigh", type=float, nargs=2, default=(0.0, 0.0),
+                       metavar=("A_M", "A_K"),
+                       help="Rayleigh damping mass and stiffness factors")
+
+    args = parser.parse_args()
+
+    df = run_transient(
+        args.mesh,
+        args.pressure,
+        args.frequency,
+        pulses=args.pulses,
+        duty=args.duty,
+        rise=args.rise,
+        samples_per_pulse=args.samples_per_pulse,
+        scheme=args.scheme,
+        rho_inf=args.rho_inf,
+        damping=tuple(args.rayleigh),
+        material_1=args.sample_material,
+        length_scale=args.length_scale,
+        dataname=args.name,
+        frame_every=args.frame_every,
+    )
+    df.to_feather(args.output)
+    print(df.pivot_table("Strain", index="Time (s)", columns="Position").describe())
+
+    print("Finished.")